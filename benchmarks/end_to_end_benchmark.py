@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark of the text-to-SQL pipeline against local stand-ins.
+OpenAILLM is replaced by a scripted LLM, Database by an in-memory SQLite database and the
+OpenAI embeddings by hashing embeddings, so runs are deterministic and need no network.
+Measures throughput and p50/p99 latency of generate_and_execute_sql, schema retrieval,
+FAISS build and search and result conversion, and prints a JSON report to compare across commits.
+
+Usage:
+    python -m benchmarks.end_to_end_benchmark --tables 100 1000 --output report.json
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import tempfile
+import time
+from collections import Counter
+from typing import Callable
+
+from benchmarks.fakes import (
+    HashingEmbeddings,
+    ScriptedLLM,
+    SQLiteDatabase,
+    TypedResultDatabase,
+)
+from benchmarks.synthetic_schema import SyntheticCatalog
+from src.infrastructure.database import Database
+from src.services.database_registry import DatabaseContext, DatabaseRegistry
+from src.services.database_schema_service import DatabaseSchemaService
+from src.services.llm_text_to_sql_service import LLMTextToSQLService
+from src.services.query_result_service import EXPORT_FORMATS, QueryResultService
+from src.utils import Singleton
+
+_QUESTION_PATTERN = re.compile(r"rows of (\w+)\.(\w+)")
+
+# Model name the scripted fast tier answers to when routing is benchmarked
+_FAST_MODEL = "scripted-fast"
+
+
+def summarize(latencies: list[float]) -> dict:
+    """Throughput and latency percentiles of a list of durations in seconds."""
+    ordered = sorted(latencies)
+    total = sum(ordered)
+    return {
+        "count": len(ordered),
+        "throughput_per_second": round(len(ordered) / total, 3) if total else None,
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+        "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+    }
+
+
+def percentile(ordered: list[float], percent: float) -> float:
+    """Nearest-rank percentile of sorted values."""
+    rank = max(0, min(len(ordered) - 1, round(percent / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def timed(function: Callable, repeats: int) -> list[float]:
+    latencies = []
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        function()
+        latencies.append(time.perf_counter() - start_time)
+    return latencies
+
+
+def make_script(failure_rate: float) -> Callable[[str, int], str]:
+    """Answer each question with a query on the table it names. A deterministic share of first
+    attempts selects a missing column, so refinement runs too. With speculative candidates
+    only the first candidate fails, so another one wins."""
+
+    def answer(prompt: str, candidate_index: int) -> str:
+        schema_name, table_name = _QUESTION_PATTERN.search(prompt).groups()
+        is_refinement = "error occurred" in prompt
+        question_hash = hashlib.md5(f"{schema_name}.{table_name}".encode()).digest()
+        fails = (
+            not is_refinement
+            and candidate_index == 0
+            and question_hash[0] / 256 < failure_rate
+        )
+        columns = "missing_column" if fails else "*"
+        return f"```sql\nSELECT {columns} FROM [{schema_name}].[{table_name}]\n```"
+
+    return answer
+
+
+def set_up_stand_ins(
+    catalog: SyntheticCatalog, args: argparse.Namespace
+) -> DatabaseContext:
+    """Route every service to the local stand-ins, starting from fresh singletons."""
+    Singleton.clear_instances()
+    database_registry = DatabaseRegistry(
+        database_factory=lambda target: SQLiteDatabase(
+            catalog, args.rows_per_table, target
+        ),
+        embeddings=HashingEmbeddings(args.embedding_dimension),
+    )
+    return database_registry.get()
+
+
+def benchmark_size(table_count: int, args: argparse.Namespace) -> dict:
+    catalog = SyntheticCatalog(table_count, args.columns_per_table, args.seed)
+    database_context = set_up_stand_ins(catalog, args)
+    questions = [
+        f"Show the rows of {catalog.table_names[index * 7919 % table_count]}"
+        for index in range(args.questions)
+    ]
+    result = {"tables": table_count, "columns": table_count * catalog.columns_per_table}
+
+    schema_service = database_context.database_schema_service
+    result["schema_retrieval"] = summarize(
+        timed(lambda: schema_service.retrieve(use_cache=False), args.repeats)
+    )
+    # What a new process pays before the sidebar can show the schema
+    result["schema_snapshot_load"] = summarize(
+        timed(
+            lambda: DatabaseSchemaService(database_context.database).retrieve(),
+            args.repeats,
+        )
+    )
+
+    start_time = time.perf_counter()
+    database_context.schema_embedding_service.embed_schema()
+    result["faiss_build"] = {
+        "seconds": round(time.perf_counter() - start_time, 3),
+        "index_type": database_context.schema_embedding_service.index_type,
+    }
+
+    excerption_service = database_context.schema_excerption_service
+    search_latencies = []
+    for question in questions:
+        start_time = time.perf_counter()
+        excerption_service.retrieve_relevant_schema(question, 5)
+        search_latencies.append(time.perf_counter() - start_time)
+    result["faiss_search"] = summarize(search_latencies)
+
+    for use_rag in args.modes:
+        model_scripts = {}
+        if args.fast_model_failure_rate is not None:
+            model_scripts[_FAST_MODEL] = make_script(args.fast_model_failure_rate)
+        llm = ScriptedLLM(
+            make_script(args.failure_rate), args.llm_latency_ms / 1000, model_scripts
+        )
+        service = LLMTextToSQLService(use_rag=use_rag, llm=llm)
+        latencies, refined, wasted, tiers = [], 0, 0, Counter()
+        for question in questions:
+            start_time = time.perf_counter()
+            response = service.generate_and_execute_sql(question)
+            latencies.append(time.perf_counter() - start_time)
+            refined += response["refined"]
+            wasted += response.get("wasted_candidates", 0)
+            tiers[response["tier"]] += 1
+        mode = "rag" if use_rag else "regular"
+        result[f"generate_and_execute_sql_{mode}"] = {
+            **summarize(latencies),
+            "refined": refined,
+            "llm_calls": len(llm.prompts),
+            "llm_calls_per_model": dict(Counter(llm.models)),
+            "answering_tiers": dict(tiers),
+            "wasted_candidates": wasted,
+        }
+
+    result["result_conversion"] = benchmark_result_conversion(args)
+    result["export"] = benchmark_export(args)
+    return result
+
+
+def benchmark_result_conversion(args: argparse.Namespace) -> dict:
+    """Time Database._query_result_to_dict on a result of --result-rows rows."""
+    columns = [f"column_{index}" for index in range(args.columns_per_table)]
+    query_result = [
+        tuple(row_index * column_index for column_index in range(len(columns)))
+        for row_index in range(args.result_rows)
+    ]
+
+    class Cursor:
+        rowcount = len(query_result)
+
+    return {
+        "rows": args.result_rows,
+        **summarize(
+            timed(
+                lambda: Database._query_result_to_dict(
+                    columns, Cursor, query_result, [], time.time()
+                ),
+                args.repeats,
+            )
+        ),
+    }
+
+
+def benchmark_export(args: argparse.Namespace) -> dict:
+    """Time exports of a typed result of --result-rows rows in every format. The result has a column
+    that is NULL in the whole first batch and decimals that get more places later on."""
+    query_result_service = QueryResultService(TypedResultDatabase(args.result_rows))
+    return {
+        file_format: summarize(
+            timed(
+                lambda: query_result_service.export(
+                    "SELECT * FROM results", file_format, io.BytesIO()
+                ),
+                args.repeats,
+            )
+        )
+        for file_format in EXPORT_FORMATS
+    }
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--tables", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--columns-per-table", type=int, default=10)
+    parser.add_argument("--rows-per-table", type=int, default=100)
+    parser.add_argument("--questions", type=int, default=50)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--result-rows", type=int, default=10_000)
+    parser.add_argument(
+        "--failure-rate",
+        type=float,
+        default=0.2,
+        help="Share of questions whose first query fails and gets refined",
+    )
+    parser.add_argument(
+        "--fast-model-failure-rate",
+        type=float,
+        help="Route simple questions to a scripted fast model with this failure rate first, "
+        "routing is off when not given",
+    )
+    parser.add_argument(
+        "--llm-latency-ms",
+        type=float,
+        default=0,
+        help="Simulated LLM response time, 0 measures only the pipeline overhead",
+    )
+    parser.add_argument(
+        "--modes",
+        nargs="+",
+        choices=["rag", "regular"],
+        default=["rag", "regular"],
+    )
+    parser.add_argument("--embedding-dimension", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    args = parser.parse_args()
+    args.modes = [mode == "rag" for mode in args.modes]
+    return args
+
+
+if __name__ == "__main__":
+    # Read configuration from the environment rather than streamlit secrets
+    os.environ["ENV"] = "dev"
+    # Keep schema snapshots of synthetic catalogs out of the working directory
+    os.environ.setdefault("SCHEMA_SNAPSHOT_DIR", tempfile.mkdtemp(prefix="schema-"))
+    # Exports of --result-rows rows span several batches
+    os.environ.setdefault("EXPORT_BATCH_SIZE", "1000")
+    arguments = parse_args()
+    if arguments.fast_model_failure_rate is not None:
+        os.environ["OPENAI_FAST_MODEL"] = _FAST_MODEL
+
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "arguments": {
+            **vars(arguments),
+            "modes": ["rag" if use_rag else "regular" for use_rag in arguments.modes],
+        },
+        "results": [benchmark_size(tables, arguments) for tables in arguments.tables],
+    }
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if arguments.output:
+        with open(arguments.output, "w") as output_file:
+            output_file.write(output)
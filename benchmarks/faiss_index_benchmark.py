@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the FAISS index types used for schema retrieval.
+Builds flat, HNSW and IVF indexes over the embedded documents of synthetic schemas and reports
+build time, query latency and recall@k measured against exact flat search. The documents are the
+table or column documents of SchemaEmbeddingService for a SyntheticCatalog, embedded with the
+deterministic HashingEmbeddings stand-in and randomly projected to the size of real embeddings,
+so no OpenAI key is needed. Queries are questions naming a table and one of its columns.
+
+Usage:
+    python -m benchmarks.faiss_index_benchmark --tables 1000 10000 100000
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from benchmarks.fakes import HashingEmbeddings
+from benchmarks.synthetic_schema import SyntheticCatalog
+from src.infrastructure.faiss_index import (
+    FLAT_INDEX,
+    INDEX_TYPES,
+    FaissIndexFactory,
+)
+from src.services.database_schema_service import DatabaseSchemaService
+from src.services.schema_embedding_service import (
+    COLUMN_GRANULARITY,
+    TABLE_GRANULARITY,
+    SchemaEmbeddingService,
+)
+
+# Texts embedded at a time, so the vectors are never all held as Python lists
+_EMBEDDING_BATCH_SIZE = 1000
+
+
+def embed(
+    embeddings: HashingEmbeddings, texts: list[str], projection: np.ndarray | None
+) -> np.ndarray:
+    """Embed texts batch by batch, projected to the benchmark dimension and normalized."""
+    vectors = np.concatenate(
+        [
+            np.array(
+                embeddings.embed_documents(
+                    texts[start : start + _EMBEDDING_BATCH_SIZE]
+                ),
+                dtype="float32",
+            )
+            for start in range(0, len(texts), _EMBEDDING_BATCH_SIZE)
+        ]
+    )
+    if projection is not None:
+        vectors = vectors @ projection
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def schema_documents(catalog: SyntheticCatalog, granularity: str) -> list[str]:
+    """The texts SchemaEmbeddingService embeds for the schema of the catalog."""
+    schema = DatabaseSchemaService._add_relationships_to_schema(
+        DatabaseSchemaService._construct_schema({"rows": catalog.column_rows()}),
+        {"rows": catalog.relationship_rows()},
+    )
+    if granularity == COLUMN_GRANULARITY:
+        documents = SchemaEmbeddingService._create_column_documents(schema)
+    else:
+        documents = SchemaEmbeddingService._create_schema_documents(schema)
+    return [document.page_content for document in documents]
+
+
+def questions(
+    catalog: SyntheticCatalog, count: int, rng: np.random.Generator
+) -> list[str]:
+    """Questions about a random table and one of its columns."""
+    texts = []
+    for table_index in rng.integers(0, len(catalog.table_names), size=count):
+        table_name = catalog.table_names[table_index]
+        columns = catalog.columns(table_name)
+        column_name = columns[rng.integers(0, len(columns))][0]
+        texts.append(f"What is the {column_name} of each row in {table_name}?")
+    return texts
+
+
+def benchmark_index(
+    factory: FaissIndexFactory,
+    index_type: str,
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    top_k: int,
+    ground_truth: np.ndarray | None,
+) -> tuple[dict, np.ndarray]:
+    """Build one index type, run every query through it and measure it."""
+    start_time = time.perf_counter()
+    index = factory.create(vectors, index_type)
+    index.add(vectors)
+    build_time = time.perf_counter() - start_time
+
+    latencies = []
+    results = []
+    for query in queries:
+        start_time = time.perf_counter()
+        _, ids = index.search(query.reshape(1, -1), top_k)
+        latencies.append(time.perf_counter() - start_time)
+        results.append(ids[0])
+    results = np.array(results)
+
+    if ground_truth is None:
+        recall = 1.0
+    else:
+        hits = sum(
+            len(set(found) & set(expected))
+            for found, expected in zip(results, ground_truth)
+        )
+        recall = hits / ground_truth.size
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "index_type": index_type,
+        "build_seconds": round(build_time, 3),
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 3),
+        "p99_ms": round(float(np.percentile(latencies_ms, 99)), 3),
+        f"recall@{top_k}": round(recall, 4),
+    }, results
+
+
+def run(args: argparse.Namespace) -> list[dict]:
+    rng = np.random.default_rng(args.seed)
+    factory = FaissIndexFactory(
+        hnsw_ef_search=args.hnsw_ef_search, ivf_nprobe=args.ivf_nprobe
+    )
+    report = []
+
+    embeddings = HashingEmbeddings(args.hashing_dimension)
+    projection = None
+    if args.dimension != args.hashing_dimension:
+        # A random projection keeps the similarities of the hashed vectors (Johnson-Lindenstrauss)
+        projection = rng.standard_normal(
+            (args.hashing_dimension, args.dimension)
+        ).astype("float32")
+
+    for table_count in args.tables:
+        catalog = SyntheticCatalog(table_count, args.columns_per_table, args.seed)
+        vectors = embed(
+            embeddings, schema_documents(catalog, args.granularity), projection
+        )
+        corpus_size = len(vectors)
+        queries = embed(embeddings, questions(catalog, args.queries, rng), projection)
+
+        # Flat search is exact, so it is both the baseline and the ground truth
+        flat_result, ground_truth = benchmark_index(
+            factory, FLAT_INDEX, vectors, queries, args.top_k, None
+        )
+        results = [flat_result]
+        for index_type in INDEX_TYPES:
+            if index_type != FLAT_INDEX:
+                results.append(
+                    benchmark_index(
+                        factory, index_type, vectors, queries, args.top_k, ground_truth
+                    )[0]
+                )
+
+        for result in results:
+            result.update(
+                {
+                    "tables": table_count,
+                    "vectors": corpus_size,
+                    "auto_choice": factory.select_index_type(corpus_size),
+                }
+            )
+            report.append(result)
+            print_result(result, args.top_k)
+
+    return report
+
+
+def print_result(result: dict, top_k: int) -> None:
+    print(
+        f"tables={result['tables']:<8} vectors={result['vectors']:<9} "
+        f"index={result['index_type']:<5} build={result['build_seconds']:>8.3f}s "
+        f"p50={result['p50_ms']:>8.3f}ms p99={result['p99_ms']:>8.3f}ms "
+        f"recall@{top_k}={result[f'recall@{top_k}']:.4f} "
+        f"(auto: {result['auto_choice']})"
+    )
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--tables", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--columns-per-table", type=int, default=10)
+    parser.add_argument(
+        "--granularity",
+        choices=(TABLE_GRANULARITY, COLUMN_GRANULARITY),
+        default=TABLE_GRANULARITY,
+        help="One document per table or per column",
+    )
+    parser.add_argument(
+        "--dimension",
+        type=int,
+        default=1536,
+        help="Embedding size, 1536 for text-embedding-3-small",
+    )
+    parser.add_argument(
+        "--hashing-dimension",
+        type=int,
+        default=256,
+        help="Size of the hashing embeddings before they are projected to --dimension",
+    )
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--hnsw-ef-search", type=int, default=64)
+    parser.add_argument("--ivf-nprobe", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    benchmark_report = run(arguments)
+    if arguments.output:
+        with open(arguments.output, "w") as output_file:
+            json.dump(benchmark_report, output_file, indent=2)
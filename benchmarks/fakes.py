@@ -0,0 +1,253 @@
+"""
+Deterministic local stand-ins for the OpenAI and SQL Server dependencies, used by the benchmarks.
+"""
+
+import datetime
+import decimal
+import hashlib
+import math
+import re
+import sqlite3
+import threading
+import time
+from typing import Callable
+
+from langchain_core.embeddings import Embeddings
+
+from benchmarks.synthetic_schema import SyntheticCatalog
+from src.infrastructure.database import Database, QueryCancellation
+from src.infrastructure.exceptions import QueryError
+from src.infrastructure.tracing import Tracer
+
+# SQLite spells OFFSET ... FETCH NEXT as LIMIT ... OFFSET
+_OFFSET_FETCH = re.compile(
+    r"\bOFFSET\s+(\d+)\s+ROWS\s+FETCH\s+NEXT\s+(\d+)\s+ROWS\s+ONLY\s*$",
+    re.IGNORECASE,
+)
+_SQLITE_TYPES = {
+    "int": "INTEGER",
+    "bit": "INTEGER",
+    "decimal": "NUMERIC",
+    "float": "REAL",
+    "datetime": "TEXT",
+    "nvarchar": "TEXT",
+}
+
+
+class CannedCursor:
+    """pyodbc-like cursor that returns prepared rows instead of querying a server."""
+
+    def __init__(self, rows: list[dict]):
+        self._rows = rows
+        self.description = None
+        self.rowcount = -1
+
+    def execute(self, query: str) -> None:
+        columns = list(self._rows[0]) if self._rows else []
+        self.description = [(column,) for column in columns]
+
+    def fetchall(self) -> list[tuple]:
+        return [tuple(row.values()) for row in self._rows]
+
+
+class SQLiteDatabase(Database):
+    """
+    In-process stand-in for Database. Catalog queries are answered from a synthetic catalog
+    through canned cursors, every other query runs on an in-memory SQLite database holding
+    the catalog's tables. Schemas are attached databases, so [schema].[table] names resolve.
+    Only the round trip is replaced, the result cache in front of it still applies.
+    """
+
+    def __init__(
+        self,
+        catalog: SyntheticCatalog,
+        rows_per_table: int = 100,
+        target: str | None = None,
+    ):
+        super().__init__(target)
+        self._catalog = catalog
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(":memory:", check_same_thread=False)
+        self._create_tables(rows_per_table)
+
+    def _create_tables(self, rows_per_table: int) -> None:
+        schema_names = {name.split(".")[0] for name in self._catalog.table_names}
+        for schema_name in schema_names:
+            self._connection.execute(f"ATTACH DATABASE ':memory:' AS [{schema_name}]")
+
+        for table_name in self._catalog.table_names:
+            columns = self._catalog.columns(table_name)
+            schema_name, name = table_name.split(".")
+            column_definitions = ", ".join(
+                f"[{column}] {_SQLITE_TYPES[data_type]}"
+                for column, data_type, _ in columns
+            )
+            self._connection.execute(
+                f"CREATE TABLE [{schema_name}].[{name}] ({column_definitions})"
+            )
+            self._connection.executemany(
+                f"INSERT INTO [{schema_name}].[{name}] VALUES ({', '.join('?' * len(columns))})",
+                (
+                    [self._value(data_type, row_index) for _, data_type, _ in columns]
+                    for row_index in range(rows_per_table)
+                ),
+            )
+        self._connection.commit()
+
+    @staticmethod
+    def _value(data_type: str, row_index: int):
+        if data_type in ("int", "bit"):
+            return row_index if data_type == "int" else row_index % 2
+        if data_type in ("decimal", "float"):
+            return row_index * 1.5
+        if data_type == "datetime":
+            return f"2024-01-{row_index % 28 + 1:02d}T00:00:00"
+        return f"value {row_index}"
+
+    def _execute_query(
+        self, query: str, cancellation: QueryCancellation | None = None
+    ) -> dict:
+        """Execute a query the way Database._execute_query does, including its spans.
+        SQLite cursors cannot be cancelled, so a cancelled query stops before it starts.
+        """
+        try:
+            if cancellation is not None:
+                cancellation.raise_if_cancelled()
+            start_time = time.time()
+            if "INFORMATION_SCHEMA.COLUMNS" in query:
+                cursor = CannedCursor(self._catalog.column_rows())
+            elif "sys.foreign_keys" in query:
+                cursor = CannedCursor(self._catalog.relationship_rows())
+            elif "sys.objects" in query:
+                cursor = CannedCursor(self._catalog.catalog_checksum_rows())
+            else:
+                cursor = self._connection.cursor()
+            query = _OFFSET_FETCH.sub(r"LIMIT \2 OFFSET \1", query).replace(
+                "COUNT_BIG(", "COUNT("
+            )
+
+            with self._lock:
+                with Tracer.span("db_execute"):
+                    cursor.execute(query)
+
+                with Tracer.span("db_fetch") as span:
+                    columns = [desc[0] for desc in cursor.description]
+                    rows = []
+                    result = Database._query_result_to_dict(
+                        columns, cursor, cursor.fetchall(), rows, start_time
+                    )
+                    span.set_attribute("rows", len(rows))
+            return result
+
+        except QueryError:
+            raise
+        except Exception as e:
+            raise QueryError(f"Query execution failed: {str(e)}")
+
+    def stream_query(self, query: str, batch_size: int):
+        """Yield batches the way Database.stream_query does. The result is fetched under the lock
+        in one go, since the shared SQLite connection cannot interleave cursors across threads.
+        """
+        result = self._execute_query(query)
+        rows = [tuple(row.values()) for row in result["rows"]]
+        # Like the sqlite3 module, no type information beyond the column names
+        description = [
+            (column, None, None, None, None, None, None)
+            for column in result["column_names"]
+        ]
+        yield description, rows[:batch_size]
+        for start in range(batch_size, len(rows), batch_size):
+            yield description, rows[start : start + batch_size]
+
+
+class TypedResultDatabase:
+    """Stand-in for Database.stream_query with SQL Server type information, for exports. The "note"
+    column is NULL throughout the first batch and "amount" gets more decimal places after it,
+    as in sparse and mixed-precision results."""
+
+    def __init__(self, rows: int):
+        self._rows = rows
+
+    def stream_query(self, query: str, batch_size: int):
+        description = [
+            ("id", int, None, 10, 10, 0, False),
+            ("amount", decimal.Decimal, None, 18, 18, 4, True),
+            ("note", str, None, 200, 200, 0, True),
+            ("created_at", datetime.datetime, None, 23, 23, 3, True),
+        ]
+        start_time = datetime.datetime(2024, 1, 1)
+        for start in range(0, max(self._rows, 1), batch_size):
+            first_batch = start == 0
+            yield description, [
+                (
+                    index,
+                    decimal.Decimal(index).scaleb(-1 if first_batch else -4),
+                    None if first_batch else f"note {index}",
+                    start_time + datetime.timedelta(seconds=index),
+                )
+                for index in range(start, min(start + batch_size, self._rows))
+            ]
+
+
+class ScriptedLLM:
+    """Stand-in for OpenAILLM that answers from a script instead of calling the API.
+    The script gets the prompt and the index of the candidate being generated. Calls asking
+    for a model listed in model_scripts are answered by that model's script instead."""
+
+    def __init__(
+        self,
+        script: Callable[[str, int], str],
+        latency: float = 0.0,
+        model_scripts: dict[str, Callable[[str, int], str]] | None = None,
+    ):
+        self._script = script
+        self._latency = latency
+        self._model_scripts = model_scripts or {}
+        self.prompts = []
+        self.models = []
+
+    def generate_text(self, prompt: str, options: dict = None) -> str:
+        return self.generate_from_messages(
+            [{"role": "user", "content": prompt}], options
+        )
+
+    def generate_from_messages(self, messages: list[dict], options: dict = None) -> str:
+        return self.generate_candidates(messages, 1, options)[0]
+
+    def generate_candidates(
+        self, messages: list[dict], n: int, options: dict = None
+    ) -> list[str]:
+        """Answer with the script applied to the whole conversation as one text."""
+        prompt = "\n\n".join(message["content"] for message in messages)
+        model = (options or {}).get("model", "scripted")
+        script = self._model_scripts.get(model, self._script)
+        with Tracer.span("llm_call", model=model, candidates=n) as span:
+            self.prompts.append(prompt)
+            self.models.append(model)
+            if self._latency:
+                time.sleep(self._latency)
+            answers = [script(prompt, index) for index in range(n)]
+            # Words stand in for tokens
+            span.set_attribute("prompt_tokens", len(prompt.split()))
+            span.set_attribute(
+                "completion_tokens", sum(len(answer.split()) for answer in answers)
+            )
+            return answers
+
+
+class HashingEmbeddings(Embeddings):
+    """Deterministic bag-of-words embeddings, so similar texts still land close together."""
+
+    def __init__(self, dimension: int = 256):
+        self._dimension = dimension
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        vector = [0.0] * self._dimension
+        for token in re.findall(r"[a-z0-9]+", text.lower()):
+            digest = hashlib.blake2b(token.encode(), digest_size=8).digest()
+            vector[int.from_bytes(digest, "little") % self._dimension] += 1.0
+        norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+        return [value / norm for value in vector]
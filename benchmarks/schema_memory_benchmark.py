@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark of the in-memory schema on large synthetic catalogs.
+Compares the compact SchemaModel with the nested dicts the schema used to be built as, reporting
+retained and peak memory, build time, per-table and full serialization time and snapshot size.
+
+Usage:
+    python -m benchmarks.schema_memory_benchmark --tables 20000 --columns-per-table 25
+"""
+
+import argparse
+import gc
+import json
+import statistics
+import time
+import tracemalloc
+from typing import Callable
+
+from benchmarks.synthetic_schema import SyntheticCatalog
+from src.services.database_schema_service import DatabaseSchemaService
+
+
+def build_dict_schema(column_rows: list[dict], relationship_rows: list[dict]) -> dict:
+    """The schema as nested dicts with a dict per column, as it was built before SchemaModel."""
+    schema = {}
+    for row in column_rows:
+        full_table_name = f"{row['TABLE_SCHEMA']}.{row['TABLE_NAME']}"
+        if full_table_name not in schema:
+            schema[full_table_name] = {
+                "columns": {},
+                "relationships": {"foreign_keys": [], "referenced_by": []},
+            }
+        schema[full_table_name]["columns"][row["COLUMN_NAME"]] = {
+            "data_type": row["DATA_TYPE"],
+            "character_maximum_length": row["CHARACTER_MAXIMUM_LENGTH"],
+            "is_nullable": row["IS_NULLABLE"],
+            "column_default": row["COLUMN_DEFAULT"],
+        }
+
+    for row in relationship_rows:
+        fk_table_name, pk_table_name = row["FK_TABLE_NAME"], row["PK_TABLE_NAME"]
+        if fk_table_name not in schema or pk_table_name not in schema:
+            continue
+        schema[fk_table_name]["relationships"]["foreign_keys"].append(
+            {
+                "constraint_name": row["CONSTRAINT_NAME"],
+                "column": row["FK_COLUMN_NAME"],
+                "references_table": pk_table_name,
+                "references_column": row["PK_COLUMN_NAME"],
+            }
+        )
+        schema[pk_table_name]["relationships"]["referenced_by"].append(
+            {
+                "constraint_name": row["CONSTRAINT_NAME"],
+                "table": fk_table_name,
+                "column": row["FK_COLUMN_NAME"],
+                "referenced_column": row["PK_COLUMN_NAME"],
+            }
+        )
+    return schema
+
+
+def build_schema_model(column_rows: list[dict], relationship_rows: list[dict]):
+    schema = DatabaseSchemaService._construct_schema({"rows": column_rows})
+    return DatabaseSchemaService._add_relationships_to_schema(
+        schema, {"rows": relationship_rows}
+    )
+
+
+def fetch_rows(catalog: SyntheticCatalog) -> tuple[list[dict], list[dict]]:
+    """Catalog rows with their own string objects, as a database driver returns them."""
+    return json.loads(json.dumps([catalog.column_rows(), catalog.relationship_rows()]))
+
+
+def measure_memory(catalog: SyntheticCatalog, build: Callable) -> tuple:
+    """Memory still held by the built schema once the rows are gone, and the peak while building."""
+    gc.collect()
+    tracemalloc.start()
+    column_rows, relationship_rows = fetch_rows(catalog)
+    rows_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    schema = build(column_rows, relationship_rows)
+    del column_rows, relationship_rows
+    gc.collect()
+    retained_bytes, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return schema, {
+        "retained_mb": round(retained_bytes / 2**20, 1),
+        # Includes the rows, which the schema is built from
+        "peak_mb": round(peak_bytes / 2**20, 1),
+        "rows_mb": round(rows_bytes / 2**20, 1),
+    }
+
+
+def measure_build_seconds(catalog: SyntheticCatalog, build: Callable) -> float:
+    column_rows, relationship_rows = fetch_rows(catalog)
+    start_time = time.perf_counter()
+    build(column_rows, relationship_rows)
+    return round(time.perf_counter() - start_time, 3)
+
+
+def serialization_latency(schema, table_names: list[str]) -> dict:
+    """Time to turn one table into the JSON of a prompt or a vector store document."""
+    latencies = []
+    for table_name in table_names:
+        start_time = time.perf_counter()
+        json.dumps(schema[table_name])
+        latencies.append(time.perf_counter() - start_time)
+    latencies.sort()
+    return {
+        "mean_us": round(statistics.fmean(latencies) * 1e6, 2),
+        "p50_us": round(latencies[len(latencies) // 2] * 1e6, 2),
+        "p99_us": round(latencies[int(len(latencies) * 0.99)] * 1e6, 2),
+    }
+
+
+def full_serialization_seconds(schema) -> list[float]:
+    """Time to serialize the whole schema for the sidebar or a regular generation prompt, twice,
+    as on two Streamlit reruns."""
+    seconds = []
+    for _ in range(2):
+        start_time = time.perf_counter()
+        if isinstance(schema, dict):
+            json.dumps(schema, indent=2)
+        else:
+            schema.to_json()
+        seconds.append(round(time.perf_counter() - start_time, 3))
+    return seconds
+
+
+def run(args: argparse.Namespace) -> dict:
+    catalog = SyntheticCatalog(args.tables, args.columns_per_table, args.seed)
+    sampled_tables = catalog.table_names[:: max(1, args.tables // args.samples)]
+    report = {
+        "tables": args.tables,
+        "columns": args.tables * catalog.columns_per_table,
+    }
+
+    for layout, build in (("dict", build_dict_schema), ("model", build_schema_model)):
+        schema, memory = measure_memory(catalog, build)
+        result = {
+            **memory,
+            "build_seconds": measure_build_seconds(catalog, build),
+            "table_serialization": serialization_latency(schema, sampled_tables),
+        }
+        result["full_serialization_seconds"] = full_serialization_seconds(schema)
+        if layout == "model":
+            start_time = time.perf_counter()
+            result["estimated_mb"] = round(schema.estimate_size() / 2**20, 1)
+            result["estimate_seconds"] = round(time.perf_counter() - start_time, 3)
+            # The budget of the database registry relies on the estimate. On small catalogs the
+            # retained memory also holds a one-off growth of the interpreter's interned strings table
+            result["estimate_ratio"] = round(
+                result["estimated_mb"] / result["retained_mb"], 3
+            )
+            snapshot = schema.to_compact()
+        else:
+            snapshot = schema
+        result["snapshot_json_mb"] = round(len(json.dumps(snapshot)) / 2**20, 1)
+        report[layout] = result
+        del schema, snapshot
+
+    report["retained_ratio"] = round(
+        report["model"]["retained_mb"] / report["dict"]["retained_mb"], 3
+    )
+    print(json.dumps(report, indent=2))
+    return report
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--tables", type=int, default=20_000)
+    parser.add_argument("--columns-per-table", type=int, default=25)
+    parser.add_argument(
+        "--samples", type=int, default=1000, help="Tables timed for serialization"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    benchmark_report = run(arguments)
+    if arguments.output:
+        with open(arguments.output, "w") as output_file:
+            json.dump(benchmark_report, output_file, indent=2)
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark and regression guard for the main.py -> UI path.
+Runs `python -X importtime` on main.py in a fresh interpreter, reports the slowest packages
+and the time to construct the UI, and fails when a deferred heavy module is imported eagerly.
+pandas and numpy are not guarded because streamlit itself imports them.
+
+Usage:
+    python -m benchmarks.startup_benchmark --max-import-ms 3000
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must only be imported once the feature using them runs
+DEFERRED_MODULES = (
+    "langchain",
+    "langchain_core",
+    "langchain_community",
+    "langchain_openai",
+    "faiss",
+    "openai",
+    "pyodbc",
+)
+
+_CONSTRUCT_UI_SNIPPET = """
+import time
+start_time = time.perf_counter()
+import main
+from src.presentation.ui import UI
+UI()
+print(time.perf_counter() - start_time)
+"""
+
+
+def run_python(arguments: list[str]) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *arguments],
+        cwd=PROJECT_ROOT,
+        env={**os.environ, "ENV": "dev"},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def parse_import_times(importtime_output: str) -> list[dict]:
+    """Parse `-X importtime` lines into modules with self and cumulative times in microseconds."""
+    imports = []
+    for line in importtime_output.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:") :].split("|")
+        imports.append(
+            {
+                "module": module.strip(),
+                "depth": (len(module) - len(module.lstrip()) - 1) // 2,
+                "self_us": int(self_us),
+                "cumulative_us": int(cumulative_us),
+            }
+        )
+    return imports
+
+
+def slowest_packages(imports: list[dict], top: int) -> list[dict]:
+    """Sum the self time of every module per top-level package and return the slowest."""
+    package_times = {}
+    for entry in imports:
+        package = entry["module"].split(".")[0]
+        package_times[package] = package_times.get(package, 0) + entry["self_us"]
+
+    return [
+        {"package": package, "self_ms": self_us / 1000}
+        for package, self_us in sorted(
+            package_times.items(), key=lambda item: item[1], reverse=True
+        )[:top]
+    ]
+
+
+def measure(top: int) -> dict:
+    imports = parse_import_times(
+        run_python(["-X", "importtime", "-c", "import main"]).stderr
+    )
+    main_import = next(entry for entry in imports if entry["module"] == "main")
+    imported_modules = {entry["module"] for entry in imports}
+
+    return {
+        "import_main_ms": main_import["cumulative_us"] / 1000,
+        "import_and_construct_ui_ms": round(
+            float(run_python(["-c", _CONSTRUCT_UI_SNIPPET]).stdout) * 1000, 3
+        ),
+        "eager_deferred_modules": [
+            module for module in DEFERRED_MODULES if module in imported_modules
+        ],
+        "slowest_packages": slowest_packages(imports, top),
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--top", type=int, default=10, help="Slowest packages to list")
+    parser.add_argument(
+        "--max-import-ms",
+        type=float,
+        help="Fail when importing main.py takes longer than this",
+    )
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    report = measure(arguments.top)
+    print(json.dumps(report, indent=2))
+
+    if arguments.output:
+        with open(arguments.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+
+    failures = []
+    if report["eager_deferred_modules"]:
+        failures.append(
+            f"Deferred modules imported at startup: {', '.join(report['eager_deferred_modules'])}"
+        )
+    if arguments.max_import_ms and report["import_main_ms"] > arguments.max_import_ms:
+        failures.append(
+            f"Importing main.py took {report['import_main_ms']:.0f}ms, "
+            f"budget is {arguments.max_import_ms:.0f}ms"
+        )
+    if failures:
+        sys.exit("\n".join(failures))
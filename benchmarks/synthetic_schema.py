@@ -0,0 +1,108 @@
+"""
+Synthetic SQL Server catalogs of configurable size for benchmarks.
+Rows have the same shape as the results of the catalog queries in DatabaseSchemaService.
+"""
+
+import random
+import zlib
+
+_SCHEMA_NAMES = ("sales", "person", "production", "purchasing", "hr")
+_ENTITY_NAMES = (
+    "customer",
+    "order",
+    "product",
+    "invoice",
+    "shipment",
+    "employee",
+    "vendor",
+    "payment",
+    "address",
+    "category",
+)
+_COLUMN_TYPES = (
+    ("name", "nvarchar", 50),
+    ("amount", "decimal", None),
+    ("quantity", "int", None),
+    ("status", "nvarchar", 20),
+    ("created_at", "datetime", None),
+    ("is_active", "bit", None),
+    ("description", "nvarchar", 200),
+    ("rate", "float", None),
+)
+
+
+class SyntheticCatalog:
+    """A generated catalog where every table has an id, typed columns and a foreign key to another table."""
+
+    def __init__(self, tables: int, columns_per_table: int = 10, seed: int = 0):
+        rng = random.Random(seed)
+        self.table_names = [self._table_name(index) for index in range(tables)]
+        self.columns_per_table = max(2, columns_per_table)
+        self.referenced_tables = [
+            self.table_names[rng.randrange(tables)] for _ in range(tables)
+        ]
+
+    @staticmethod
+    def _table_name(index: int) -> str:
+        schema_name = _SCHEMA_NAMES[index % len(_SCHEMA_NAMES)]
+        entity_name = _ENTITY_NAMES[(index // len(_SCHEMA_NAMES)) % len(_ENTITY_NAMES)]
+        return f"{schema_name}.{entity_name}_{index}"
+
+    def columns(self, table_name: str) -> list[tuple]:
+        """(column name, data type, character maximum length) of a table, id first."""
+        entity_name = table_name.split(".")[1].rsplit("_", 1)[0]
+        columns = [("id", "int", None), (f"{entity_name}_ref_id", "int", None)]
+        for index in range(self.columns_per_table - 2):
+            column_name, data_type, max_length = _COLUMN_TYPES[
+                index % len(_COLUMN_TYPES)
+            ]
+            suffix = "" if index < len(_COLUMN_TYPES) else f"_{index}"
+            columns.append((f"{column_name}{suffix}", data_type, max_length))
+        return columns
+
+    def column_rows(self) -> list[dict]:
+        """Rows as returned by the INFORMATION_SCHEMA.COLUMNS query."""
+        rows = []
+        for table_name in self.table_names:
+            schema_name, name = table_name.split(".")
+            for column_name, data_type, max_length in self.columns(table_name):
+                rows.append(
+                    {
+                        "TABLE_SCHEMA": schema_name,
+                        "TABLE_NAME": name,
+                        "COLUMN_NAME": column_name,
+                        "DATA_TYPE": data_type,
+                        "CHARACTER_MAXIMUM_LENGTH": max_length,
+                        "IS_NULLABLE": "NO" if column_name == "id" else "YES",
+                        "COLUMN_DEFAULT": None,
+                    }
+                )
+        return rows
+
+    def relationship_rows(self) -> list[dict]:
+        """Rows as returned by the sys.foreign_keys query."""
+        rows = []
+        for index, (table_name, referenced_table) in enumerate(
+            zip(self.table_names, self.referenced_tables)
+        ):
+            entity_name = table_name.split(".")[1].rsplit("_", 1)[0]
+            rows.append(
+                {
+                    "CONSTRAINT_NAME": f"FK_{index}",
+                    "FK_TABLE_NAME": table_name,
+                    "FK_COLUMN_NAME": f"{entity_name}_ref_id",
+                    "PK_TABLE_NAME": referenced_table,
+                    "PK_COLUMN_NAME": "id",
+                }
+            )
+        return rows
+
+    def catalog_checksum_rows(self) -> list[dict]:
+        """Rows as returned by the sys.objects checksum query, changing with the set of tables."""
+        return [
+            {
+                "OBJECT_COUNT": len(self.table_names),
+                "LAST_MODIFIED": None,
+                "OBJECT_CHECKSUM": zlib.crc32(",".join(self.table_names).encode()),
+            }
+        ]
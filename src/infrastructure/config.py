@@ -21,6 +21,12 @@ class EnvConfig(metaclass=Singleton):
     def get_float(self, key: str, default: float = 0.0) -> float:
         return float(self.get(key, default))
 
+    def get_int(self, key: str, default: int = 0) -> int:
+        return int(self.get(key, default))
+
+    def get_bool(self, key: str, default: bool = False) -> bool:
+        return str(self.get(key, default)).lower() in ("1", "true", "yes", "on")
+
     @property
     def db_server(self) -> str:
         return self.get("SQL_SERVER", self.get("DB_SERVER", "localhost"))
@@ -29,6 +35,23 @@ class EnvConfig(metaclass=Singleton):
     def db_name(self) -> str:
         return self.get("SQL_DATABASE", "")
 
+    @property
+    def db_names(self) -> list[str]:
+        """Databases the deployment serves, as "database" on SQL_SERVER or "server/database".
+        The first one is the default."""
+        names = [
+            name.strip()
+            for name in self.get("SQL_DATABASES", "").split(",")
+            if name.strip()
+        ]
+        return names or [self.db_name]
+
+    @property
+    def database_registry_max_bytes(self) -> int:
+        """Memory budget for the schemas and indexes of loaded databases, beyond which the least
+        recently used databases are unloaded."""
+        return self.get_int("DATABASE_REGISTRY_MAX_MB", 1024) * 1024 * 1024
+
     @property
     def db_user(self) -> str:
         return self.get("SQL_USER", "")
@@ -37,6 +60,11 @@ class EnvConfig(metaclass=Singleton):
     def db_password(self) -> str:
         return self.get("SQL_PASSWORD", "")
 
+    @property
+    def db_pool_size(self) -> int:
+        """Idle database connections kept open for reuse."""
+        return self.get_int("SQL_POOL_SIZE", 4)
+
     @property
     def openai_api_key(self) -> str:
         return self.get("OPENAI_API_KEY", "")
@@ -45,10 +73,106 @@ class EnvConfig(metaclass=Singleton):
     def openai_model(self) -> str:
         return self.get("OPENAI_MODEL", "gpt-4.1-mini")
 
+    @property
+    def openai_fast_model(self) -> str:
+        """Smaller model tried first for simple questions, empty sends every call to openai_model."""
+        return self.get("OPENAI_FAST_MODEL", "")
+
+    @property
+    def routing_max_tables(self) -> int:
+        """Most schema tables in the prompt for a question to count as simple."""
+        return self.get_int("ROUTING_MAX_TABLES", 5)
+
+    @property
+    def routing_max_question_words(self) -> int:
+        """Most words in a question for it to count as simple."""
+        return self.get_int("ROUTING_MAX_QUESTION_WORDS", 25)
+
     @property
     def openai_temperature(self) -> float:
         return self.get_float("OPENAI_TEMPERATURE", 0)
 
+    @property
+    def speculative_candidates(self) -> int:
+        """SQL candidates generated and executed in parallel per attempt, 1 disables speculation."""
+        return self.get_int("SPECULATIVE_CANDIDATES", 1)
+
+    @property
+    def speculative_temperature(self) -> float:
+        """Sampling temperature for speculative candidates, above 0 so they differ."""
+        return self.get_float("SPECULATIVE_TEMPERATURE", 0.7)
+
+    @property
+    def faiss_index_type(self) -> str:
+        """FAISS index type: "auto" (chosen by corpus size), "flat", "ivf" or "hnsw"."""
+        return self.get("FAISS_INDEX_TYPE", "auto").lower()
+
+    @property
+    def faiss_flat_max_vectors(self) -> int:
+        """Largest corpus that is still searched with an exact flat index in auto mode."""
+        return self.get_int("FAISS_FLAT_MAX_VECTORS", 20_000)
+
+    @property
+    def faiss_hnsw_max_vectors(self) -> int:
+        """Largest corpus that uses HNSW in auto mode, bigger corpora use IVF."""
+        return self.get_int("FAISS_HNSW_MAX_VECTORS", 1_000_000)
+
+    @property
+    def faiss_hnsw_ef_search(self) -> int:
+        return self.get_int("FAISS_HNSW_EF_SEARCH", 64)
+
+    @property
+    def faiss_ivf_nprobe(self) -> int:
+        return self.get_int("FAISS_IVF_NPROBE", 16)
+
+    @property
+    def schema_document_granularity(self) -> str:
+        """Granularity of the embedded schema documents: "table" or "column"."""
+        return self.get("SCHEMA_DOCUMENT_GRANULARITY", "table").lower()
+
+    @property
+    def schema_snapshot_dir(self) -> str:
+        """Directory for schema snapshots that let a new process start without catalog queries,
+        empty disables them."""
+        return self.get("SCHEMA_SNAPSHOT_DIR", ".schema_snapshots")
+
+    @property
+    def result_cache_enabled(self) -> bool:
+        """Whether results of read-only queries are cached, off by default."""
+        return self.get_bool("RESULT_CACHE_ENABLED", False)
+
+    @property
+    def result_cache_ttl_seconds(self) -> float:
+        return self.get_float("RESULT_CACHE_TTL_SECONDS", 300)
+
+    @property
+    def result_cache_max_bytes(self) -> int:
+        return self.get_int("RESULT_CACHE_MAX_MB", 256) * 1024 * 1024
+
+    @property
+    def result_cache_spill_dir(self) -> str:
+        """Directory for results evicted from memory, empty disables spilling to disk."""
+        return self.get("RESULT_CACHE_SPILL_DIR", "")
+
+    @property
+    def result_cache_spill_max_bytes(self) -> int:
+        return self.get_int("RESULT_CACHE_SPILL_MAX_MB", 1024) * 1024 * 1024
+
+    @property
+    def result_page_size(self) -> int:
+        """Rows fetched and shown per page of a result."""
+        return self.get_int("RESULT_PAGE_SIZE", 100)
+
+    @property
+    def export_batch_size(self) -> int:
+        """Rows fetched at a time while exporting or counting a result."""
+        return self.get_int("EXPORT_BATCH_SIZE", 10000)
+
+    @property
+    def metrics_port(self) -> int:
+        """Port of the Prometheus /metrics endpoint, 0 disables it."""
+        return self.get_int("METRICS_PORT", 0)
+
     @property
     def is_streamlit_prod(self) -> bool:
         """Check if running in Streamlit production environment."""
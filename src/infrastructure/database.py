@@ -1,17 +1,78 @@
 import json
 import os
+import queue
+import threading
 import time
-import pyodbc
+from contextlib import contextmanager
+from typing import Iterator
 from src.infrastructure.config import EnvConfig
 from src.infrastructure.exceptions import QueryError
-from src.utils import Singleton
+from src.infrastructure.result_cache import ResultCache
+from src.infrastructure.tracing import Tracer
 
 
-class Database(metaclass=Singleton):
-    """Singleton class for accessing the database."""
+class _StaleConnectionError(Exception):
+    """A pooled connection was found dropped when it was used."""
+
+
+class QueryCancellation:
+    """Lets another thread cancel the queries registered with it, running or not yet started."""
 
     def __init__(self):
+        self._lock = threading.Lock()
+        self._cursors = set()
+        self.cancelled = False
+
+    def cancel(self) -> None:
+        with self._lock:
+            self.cancelled = True
+            cursors = list(self._cursors)
+        for cursor in cursors:
+            try:
+                cursor.cancel()
+            except Exception:
+                # The query may have finished in the meantime
+                pass
+
+    def raise_if_cancelled(self) -> None:
+        if self.cancelled:
+            raise QueryError("Query was cancelled")
+
+    def register(self, cursor) -> None:
+        with self._lock:
+            self.raise_if_cancelled()
+            self._cursors.add(cursor)
+
+    def unregister(self, cursor) -> None:
+        with self._lock:
+            self._cursors.discard(cursor)
+
+
+class Database:
+    """Access to one database, given as "database" on the configured server or "server/database"."""
+
+    def __init__(self, target: str | None = None):
         self._config = EnvConfig()
+        self._target = target or self._config.db_names[0]
+        server, _, name = self._target.rpartition("/")
+        self._server = server or self._config.db_server
+        self._name = name
+        # Idle connections, reused so that concurrent queries do not each pay for a login
+        self._connection_pool = queue.LifoQueue()
+        self._closed = False
+
+    @property
+    def target(self) -> str:
+        return self._target
+
+    def close(self) -> None:
+        """Close the idle connections; connections in use are closed when they are released."""
+        self._closed = True
+        while True:
+            try:
+                self._connection_pool.get_nowait().close()
+            except queue.Empty:
+                break
 
     @property
     def _connection_string(self) -> str:
@@ -25,39 +86,173 @@ class Database(metaclass=Singleton):
 
         return (
             f"DRIVER={driver};"
-            f"SERVER={self._config.db_server},1433;"
-            f"DATABASE={self._config.db_name};"
+            f"SERVER={self._server},1433;"
+            f"DATABASE={self._name};"
             f"UID={self._config.db_user};"
             f"PWD={self._config.db_password};"
             f"TDS_Version=7.3;"
             f"TrustServerCertificate=yes;"
         )
 
-    def execute_query(self, query: str) -> dict:
-        """Execute a SQL query and return the results."""
+    @contextmanager
+    def _connection(self, reuse: bool = True):
+        """Borrow a pooled connection, opening one if none is idle or reuse is False. Connections are
+        returned to the pool unless they failed with something other than an error in the SQL itself.
+        A pooled connection the server or the network dropped while it was idle raises
+        _StaleConnectionError, for the caller to retry once on a fresh connection.
+        """
+        import pyodbc  # Deferred, loading the ODBC driver manager slows down startup
+
+        conn = None
+        if reuse:
+            try:
+                conn = self._connection_pool.get_nowait()
+            except queue.Empty:
+                pass
+        pooled = conn is not None
+        if conn is None:
+            with Tracer.span("db_connect"):
+                conn = pyodbc.connect(self._connection_string)
+
+        try:
+            yield conn
+        except pyodbc.ProgrammingError:
+            if not conn.autocommit:
+                conn.rollback()
+            self._release_connection(conn)
+            raise
+        except BaseException as e:
+            # Includes a streamed result abandoned mid-way, which leaves the connection busy
+            conn.close()
+            # SQLSTATE class 08 is a connection exception, the statement's transaction is rolled back
+            if (
+                pooled
+                and isinstance(e, pyodbc.Error)
+                and str(e.args[0]).startswith("08")
+            ):
+                raise _StaleConnectionError() from e
+            raise
+        else:
+            self._release_connection(conn)
+
+    def _release_connection(self, conn) -> None:
+        if (
+            not self._closed
+            and self._connection_pool.qsize() < self._config.db_pool_size
+        ):
+            self._connection_pool.put(conn)
+        else:
+            conn.close()
+
+    def execute_query(
+        self,
+        query: str,
+        use_cache: bool = True,
+        cancellation: QueryCancellation | None = None,
+    ) -> dict:
+        """Execute a SQL query and return the results.
+        Read-only queries are served from the result cache when it is enabled."""
+        result_cache = ResultCache()
+        if not use_cache or not result_cache.is_cacheable(query):
+            return self._execute_query(query, cancellation)
+
+        with Tracer.span("result_cache_lookup") as span:
+            result = result_cache.get(self._target, query)
+            span.set_attribute("hit", result is not None)
+        if result is not None:
+            return result
+
+        result = self._execute_query(query, cancellation)
+        result_cache.put(self._target, query, result)
+        return {**result, "cached": False}
+
+    def _execute_query(
+        self, query: str, cancellation: QueryCancellation | None = None
+    ) -> dict:
         try:
             start_time = time.time()
+            try:
+                return self._execute_on_connection(query, cancellation, start_time)
+            except _StaleConnectionError:
+                return self._execute_on_connection(
+                    query, cancellation, start_time, reuse=False
+                )
 
-            with pyodbc.connect(self._connection_string) as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute(query)
+        except QueryError:
+            raise
+        except Exception as e:
+            raise QueryError(f"Query execution failed: {str(e)}")
+
+    def _execute_on_connection(
+        self,
+        query: str,
+        cancellation: QueryCancellation | None,
+        start_time: float,
+        reuse: bool = True,
+    ) -> dict:
+        with self._connection(reuse) as conn:
+            with conn.cursor() as cursor:
+                if cancellation:
+                    cancellation.register(cursor)
+                try:
+                    with Tracer.span("db_execute"):
+                        cursor.execute(query)
 
-                    columns = [desc[0] for desc in cursor.description]
-                    rows = []
+                    with Tracer.span("db_fetch") as span:
+                        columns = [desc[0] for desc in cursor.description]
+                        rows = []
 
-                    query_result = cursor.fetchall()
-                    result = Database._query_result_to_dict(
-                        columns, cursor, query_result, rows, start_time
-                    )
+                        query_result = cursor.fetchall()
+                        result = Database._query_result_to_dict(
+                            columns, cursor, query_result, rows, start_time
+                        )
+                        span.set_attribute("rows", len(rows))
+                finally:
+                    if cancellation:
+                        cancellation.unregister(cursor)
 
-                    if not conn.autocommit:
-                        conn.commit()
+                if not conn.autocommit:
+                    conn.commit()
 
-                    return result
+                return result
+
+    def stream_query(
+        self, query: str, batch_size: int
+    ) -> Iterator[tuple[list[tuple], list[tuple]]]:
+        """Execute a SQL query and yield its DB-API column descriptions (name, type code, display size,
+        internal size, precision, scale, nullable) with each batch of up to batch_size rows, so large
+        results never have to be held at once. Bypasses the result cache."""
+        try:
+            try:
+                batches = self._stream_on_connection(query, batch_size)
+                first_batch = next(batches)
+            except _StaleConnectionError:
+                # Nothing was yielded yet, so the query can start over
+                batches = self._stream_on_connection(query, batch_size, reuse=False)
+                first_batch = next(batches)
+            yield first_batch
+            yield from batches
 
         except Exception as e:
             raise QueryError(f"Query execution failed: {str(e)}")
 
+    def _stream_on_connection(
+        self, query: str, batch_size: int, reuse: bool = True
+    ) -> Iterator[tuple[list[tuple], list[tuple]]]:
+        with self._connection(reuse) as conn:
+            with conn.cursor() as cursor:
+                with Tracer.span("db_execute"):
+                    cursor.execute(query)
+                description = [tuple(desc) for desc in cursor.description]
+
+                batch = cursor.fetchmany(batch_size)
+                # An empty result still yields once, with its columns
+                yield description, batch
+                while len(batch) == batch_size:
+                    batch = cursor.fetchmany(batch_size)
+                    if batch:
+                        yield description, batch
+
     @staticmethod
     def _query_result_to_dict(columns, cursor, query_result, rows, start_time):
         for row in query_result:
@@ -0,0 +1,78 @@
+import math
+import faiss
+import numpy as np
+
+FLAT_INDEX = "flat"
+IVF_INDEX = "ivf"
+HNSW_INDEX = "hnsw"
+AUTO_INDEX = "auto"
+INDEX_TYPES = (FLAT_INDEX, IVF_INDEX, HNSW_INDEX)
+
+
+class FaissIndexFactory:
+    """Creates FAISS indexes whose type is chosen by the size of the corpus."""
+
+    def __init__(
+        self,
+        flat_max_vectors: int = 20_000,
+        hnsw_max_vectors: int = 1_000_000,
+        hnsw_m: int = 32,
+        hnsw_ef_search: int = 64,
+        ivf_nprobe: int = 16,
+    ):
+        self._flat_max_vectors = flat_max_vectors
+        self._hnsw_max_vectors = hnsw_max_vectors
+        self._hnsw_m = hnsw_m
+        self._hnsw_ef_search = hnsw_ef_search
+        self._ivf_nprobe = ivf_nprobe
+
+    def select_index_type(self, corpus_size: int, requested: str = AUTO_INDEX) -> str:
+        """Resolve the index type for a corpus, "auto" picks one by corpus size."""
+        if requested in INDEX_TYPES:
+            return requested
+        if requested != AUTO_INDEX:
+            raise ValueError(f"Unknown FAISS index type: {requested}")
+
+        if corpus_size <= self._flat_max_vectors:
+            return FLAT_INDEX
+        if corpus_size <= self._hnsw_max_vectors:
+            return HNSW_INDEX
+        return IVF_INDEX
+
+    def create(self, vectors: np.ndarray, index_type: str) -> faiss.Index:
+        """Create an empty index for the vectors, trained on them when the index type needs it."""
+        dimension = vectors.shape[1]
+
+        if index_type == FLAT_INDEX:
+            return faiss.IndexFlatL2(dimension)
+
+        if index_type == HNSW_INDEX:
+            index = faiss.IndexHNSWFlat(dimension, self._hnsw_m)
+            index.hnsw.efSearch = self._hnsw_ef_search
+            return index
+
+        if index_type == IVF_INDEX:
+            nlist = self._ivf_list_count(len(vectors))
+            index = faiss.IndexIVFFlat(faiss.IndexFlatL2(dimension), dimension, nlist)
+            index.train(vectors)
+            index.nprobe = min(self._ivf_nprobe, nlist)
+            return index
+
+        raise ValueError(f"Unknown FAISS index type: {index_type}")
+
+    def estimate_size(self, index_type: str, corpus_size: int, dimension: int) -> int:
+        """Approximate memory of an index holding corpus_size vectors."""
+        vector_bytes = corpus_size * dimension * 4
+        if index_type == HNSW_INDEX:
+            # Every vector keeps about 2*M neighbour ids on the base level
+            return vector_bytes + corpus_size * self._hnsw_m * 2 * 4
+        if index_type == IVF_INDEX:
+            # Centroids, plus an id per vector in the inverted lists
+            nlist = self._ivf_list_count(corpus_size)
+            return vector_bytes + nlist * dimension * 4 + corpus_size * 8
+        return vector_bytes
+
+    @staticmethod
+    def _ivf_list_count(corpus_size: int) -> int:
+        """Number of IVF cells, ~4*sqrt(n) capped so each cell has enough training points."""
+        return max(1, min(int(4 * math.sqrt(corpus_size)), corpus_size // 39))
@@ -0,0 +1,131 @@
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from src.utils import Singleton
+
+_DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class _Histogram:
+    """Cumulative-bucket histogram in the shape Prometheus expects."""
+
+    def __init__(self, buckets: tuple = _DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            self.bucket_counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+
+class MetricsRegistry(metaclass=Singleton):
+    """Process-wide counters and histograms, exportable in the Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._http_server = None
+
+    def increment(self, name: str, value: float = 1, **labels) -> None:
+        """Add to a counter identified by its name and labels."""
+        key = (name, self._label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        """Record a value, typically a duration in seconds, in a histogram."""
+        key = (name, self._label_key(labels))
+        with self._lock:
+            if key not in self._histograms:
+                self._histograms[key] = _Histogram()
+            self._histograms[key].observe(value)
+
+    def render_prometheus(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name in sorted({name for name, _ in self._counters}):
+                lines.append(f"# TYPE {name} counter")
+                for (counter_name, labels), value in self._counters.items():
+                    if counter_name == name:
+                        lines.append(f"{name}{self._format_labels(labels)} {value}")
+
+            for name in sorted({name for name, _ in self._histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (histogram_name, labels), histogram in self._histograms.items():
+                    if histogram_name != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.bucket_counts):
+                        cumulative += count
+                        bucket_labels = labels + (("le", str(bound)),)
+                        lines.append(
+                            f"{name}_bucket{self._format_labels(bucket_labels)} {cumulative}"
+                        )
+                    lines.append(
+                        f"{name}_bucket{self._format_labels(labels + (('le', '+Inf'),))} {histogram.count}"
+                    )
+                    lines.append(
+                        f"{name}_sum{self._format_labels(labels)} {histogram.sum}"
+                    )
+                    lines.append(
+                        f"{name}_count{self._format_labels(labels)} {histogram.count}"
+                    )
+
+        return "\n".join(lines) + "\n"
+
+    def start_http_server(self, port: int) -> None:
+        """Serve the metrics on http://0.0.0.0:<port>/metrics from a daemon thread, once per process."""
+        with self._lock:
+            if self._http_server is not None:
+                return
+            self._http_server = ThreadingHTTPServer(
+                ("0.0.0.0", port), self._handler_class()
+            )
+
+        threading.Thread(
+            target=self._http_server.serve_forever, name="metrics-server", daemon=True
+        ).start()
+
+    def _handler_class(self) -> type:
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render_prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args) -> None:
+                pass
+
+        return MetricsHandler
+
+    @staticmethod
+    def _label_key(labels: dict) -> tuple:
+        return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    @staticmethod
+    def _format_labels(labels: tuple) -> str:
+        if not labels:
+            return ""
+        formatted = (
+            '{}="{}"'.format(
+                key,
+                value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+            )
+            for key, value in labels
+        )
+        return "{" + ",".join(formatted) + "}"
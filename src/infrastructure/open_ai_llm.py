@@ -1,10 +1,7 @@
-from openai import OpenAI
-from openai.types.chat import (
-    ChatCompletionSystemMessageParam,
-    ChatCompletionUserMessageParam,
-)
 from src.infrastructure.config import EnvConfig
 from src.infrastructure.exceptions import LLMServiceError
+from src.infrastructure.metrics import MetricsRegistry
+from src.infrastructure.tracing import Span, Tracer
 
 
 class OpenAILLM:
@@ -13,31 +10,81 @@ class OpenAILLM:
     def __init__(self):
         self._config = EnvConfig()
         try:
+            from openai import OpenAI  # Deferred, the SDK is slow to import
+
             self.client = OpenAI(api_key=self._config.openai_api_key)
         except Exception as e:
             raise LLMServiceError(f"Failed to initialize OpenAI service: {str(e)}")
 
     def generate_text(self, prompt: str, options: dict = None) -> str:
         """Generate text using the LLM based on the given prompt."""
+        return self.generate_from_messages(
+            [
+                {"role": "system", "content": "You are a SQL expert"},
+                {"role": "user", "content": prompt},
+            ],
+            options,
+        )
+
+    def generate_from_messages(self, messages: list[dict], options: dict = None) -> str:
+        """Generate the next assistant message of a conversation.
+        Keep the leading messages identical between calls, so the provider can reuse its cached prefix.
+        """
+        return self.generate_candidates(messages, 1, options)[0]
+
+    def generate_candidates(
+        self, messages: list[dict], n: int, options: dict = None
+    ) -> list[str]:
+        """Generate n alternative next assistant messages of a conversation in one request.
+        The "model" option overrides the configured model for this request."""
         try:
-            opts = {"temperature": self._config.openai_temperature}
+            opts = {
+                "model": self._config.openai_model,
+                "temperature": self._config.openai_temperature,
+            }
             if options:
                 opts.update(options)
 
-            messages = [
-                ChatCompletionSystemMessageParam(
-                    role="system", content="You are a SQL expert"
-                ),
-                ChatCompletionUserMessageParam(role="user", content=prompt),
-            ]
-
-            response = self.client.chat.completions.create(
-                model=self._config.openai_model,
-                messages=messages,
-                temperature=opts["temperature"],
-            )
+            with Tracer.span("llm_call", model=opts["model"], candidates=n) as span:
+                response = self.client.chat.completions.create(
+                    model=opts["model"],
+                    messages=messages,
+                    temperature=opts["temperature"],
+                    n=n,
+                )
+                self._record_usage(span, response.usage, opts["model"])
 
-            return response.choices[0].message.content
+            return [choice.message.content for choice in response.choices]
 
         except Exception as e:
             raise LLMServiceError(f"Text generation failed: {str(e)}")
+
+    def _record_usage(self, span: Span, usage, model: str) -> None:
+        """Attach the token counts of a response to its span and the token metrics."""
+        if usage is None:
+            return
+
+        for kind in ("prompt_tokens", "completion_tokens", "total_tokens"):
+            span.set_attribute(kind, getattr(usage, kind))
+
+        # Prompt tokens served from the provider's prefix cache
+        prompt_tokens_details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = getattr(prompt_tokens_details, "cached_tokens", None) or 0
+        span.set_attribute("cached_tokens", cached_tokens)
+
+        metrics = MetricsRegistry()
+        metrics.increment(
+            "text2sql_llm_tokens_total", usage.prompt_tokens, kind="prompt", model=model
+        )
+        metrics.increment(
+            "text2sql_llm_tokens_total",
+            usage.completion_tokens,
+            kind="completion",
+            model=model,
+        )
+        metrics.increment(
+            "text2sql_llm_tokens_total",
+            cached_tokens,
+            kind="cached_prompt",
+            model=model,
+        )
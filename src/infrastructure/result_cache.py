@@ -0,0 +1,200 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from src.infrastructure.config import EnvConfig
+from src.infrastructure.metrics import MetricsRegistry
+from src.infrastructure.sql_text import SQLText
+from src.utils import Singleton
+
+
+class _CacheEntry:
+    """A cached result, held in memory or spilled to a file on disk."""
+
+    __slots__ = ("result", "created_at", "size", "spill_path")
+
+    def __init__(self, result: dict | None, created_at: float, size: int):
+        self.result = result
+        self.created_at = created_at
+        self.size = size
+        self.spill_path = None
+
+
+class ResultCache(metaclass=Singleton):
+    """
+    Opt-in cache of query results keyed on the normalized SQL text and the database name.
+    Entries expire after a TTL; when memory use exceeds the cap the least recently used
+    entries are evicted, or spilled to disk in a columnar format when a spill directory is set.
+    """
+
+    def __init__(self):
+        self._config = EnvConfig()
+        self._enabled = self._config.result_cache_enabled
+        self._ttl = self._config.result_cache_ttl_seconds
+        self._max_bytes = self._config.result_cache_max_bytes
+        self._spill_dir = self._config.result_cache_spill_dir
+        self._spill_max_bytes = self._config.result_cache_spill_max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._spilled_entries = OrderedDict()
+        self._memory_bytes = 0
+        self._spilled_bytes = 0
+        self._metrics = MetricsRegistry()
+
+    def is_cacheable(self, query: str) -> bool:
+        """Only read-only SELECT queries are cached, anything else always reaches the database."""
+        return self._enabled and SQLText.is_read_only(query)
+
+    def get(self, database_name: str, query: str) -> dict | None:
+        """Return the cached result with its age in seconds under "cache_age", or None."""
+        key = self._key(database_name, query)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            else:
+                entry = self._spilled_entries.get(key)
+            if entry is not None and now - entry.created_at > self._ttl:
+                self._remove(key)
+                entry = None
+
+        if entry is None:
+            self._metrics.increment(
+                "text2sql_result_cache_requests_total", outcome="miss"
+            )
+            return None
+
+        result = entry.result
+        if result is None:
+            result = self._load_spilled(entry.spill_path)
+            if result is None:
+                with self._lock:
+                    # Unless the key was cached again while the file was read
+                    if self._spilled_entries.get(key) is entry:
+                        self._remove(key)
+                self._metrics.increment(
+                    "text2sql_result_cache_requests_total", outcome="miss"
+                )
+                return None
+
+        self._metrics.increment(
+            "text2sql_result_cache_requests_total",
+            outcome="hit" if entry.result is not None else "disk_hit",
+        )
+        return {**result, "cached": True, "cache_age": now - entry.created_at}
+
+    def put(self, database_name: str, query: str, result: dict) -> None:
+        key = self._key(database_name, query)
+        entry = _CacheEntry(result, time.time(), self._estimate_size(result))
+
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = entry
+            self._memory_bytes += entry.size
+            evicted = []
+            while self._memory_bytes > self._max_bytes and self._entries:
+                evicted_key, evicted_entry = self._entries.popitem(last=False)
+                self._memory_bytes -= evicted_entry.size
+                evicted.append((evicted_key, evicted_entry))
+
+        self._metrics.increment("text2sql_result_cache_evictions_total", len(evicted))
+        if self._spill_dir:
+            for evicted_key, evicted_entry in evicted:
+                self._spill(evicted_key, evicted_entry)
+
+    def _remove(self, key: str) -> None:
+        """Drop an entry from memory or disk. Must be called with the lock held."""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._memory_bytes -= entry.size
+
+        entry = self._spilled_entries.pop(key, None)
+        if entry is not None:
+            self._spilled_bytes -= entry.size
+            try:
+                os.remove(entry.spill_path)
+            except OSError:
+                pass
+
+    def _spill(self, key: str, entry: _CacheEntry) -> None:
+        """Write an evicted result to disk as a compressed Arrow IPC file, dropping the oldest spilled
+        results over the cap. Results whose columns mix value types stay evicted."""
+        import pyarrow as pa  # Deferred, only needed once results are spilled
+
+        result = entry.result
+        column_names = result["column_names"]
+        metadata = {name: value for name, value in result.items() if name != "rows"}
+
+        try:
+            table = pa.Table.from_arrays(
+                [
+                    pa.array([row[column] for row in result["rows"]])
+                    for column in column_names
+                ],
+                names=column_names,
+                metadata={"result": json.dumps(metadata, default=str)},
+            )
+            os.makedirs(self._spill_dir, exist_ok=True)
+            spill_path = os.path.join(self._spill_dir, f"{key}.arrow")
+            options = pa.ipc.IpcWriteOptions(compression="zstd")
+            with pa.OSFile(spill_path, "wb") as spill_file:
+                with pa.ipc.new_file(
+                    spill_file, table.schema, options=options
+                ) as writer:
+                    writer.write_table(table)
+            spilled = _CacheEntry(None, entry.created_at, os.path.getsize(spill_path))
+            spilled.spill_path = spill_path
+        except (OSError, TypeError, pa.ArrowException):
+            return
+
+        with self._lock:
+            if key in self._entries:
+                # Cached again while being written, the fresh entry wins
+                os.remove(spill_path)
+                return
+            self._remove(key)
+            self._spilled_entries[key] = spilled
+            self._spilled_bytes += spilled.size
+            while self._spilled_bytes > self._spill_max_bytes and self._spilled_entries:
+                self._remove(next(iter(self._spilled_entries)))
+
+    @staticmethod
+    def _load_spilled(spill_path: str) -> dict | None:
+        """Read a spilled result back. Arrow files hold data only, so nothing in the spill directory
+        can run code when it is loaded."""
+        import pyarrow as pa
+
+        try:
+            with pa.OSFile(spill_path, "rb") as spill_file:
+                table = pa.ipc.open_file(spill_file).read_all()
+            metadata = json.loads(table.schema.metadata[b"result"])
+        except (OSError, KeyError, ValueError, TypeError, pa.ArrowException):
+            return None
+
+        return {**metadata, "rows": table.to_pylist()}
+
+    @staticmethod
+    def _key(database_name: str, query: str) -> str:
+        return hashlib.sha256(
+            f"{database_name}\0{SQLText.normalize(query)}".encode()
+        ).hexdigest()
+
+    @staticmethod
+    def _estimate_size(result: dict) -> int:
+        """Approximate memory held by a result: the row dicts and their values."""
+        rows = result.get("rows", [])
+        if not rows:
+            return sys.getsizeof(result)
+
+        # Sample about a hundred rows rather than walking large results
+        sampled = rows[:: max(1, len(rows) // 100)]
+        average_row_size = sum(
+            sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row.values())
+            for row in sampled
+        ) / len(sampled)
+        return int(sys.getsizeof(rows) + average_row_size * len(rows))
@@ -0,0 +1,63 @@
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+# Bump when the layout of the snapshot or of the schema in it changes, older snapshots are ignored
+SNAPSHOT_VERSION = 2
+
+
+class SchemaSnapshot:
+    """Compressed JSON snapshots of built schemas on disk, one file per connection target."""
+
+    def __init__(self, directory: str):
+        self._directory = directory
+
+    def load(self, target: str) -> dict | None:
+        """The snapshot of a target as a dict with "schema", "checksum" and "created_at",
+        or None when there is none, it is unreadable or it has another version."""
+        try:
+            with gzip.open(self._path(target), "rt", encoding="utf-8") as snapshot_file:
+                snapshot = json.load(snapshot_file)
+        except (OSError, EOFError, ValueError):
+            return None
+
+        if (
+            not isinstance(snapshot, dict)
+            or snapshot.get("version") != SNAPSHOT_VERSION
+            or snapshot.get("target") != target
+        ):
+            return None
+        return snapshot
+
+    def save(self, target: str, schema: dict, checksum: str | None) -> None:
+        """Write the snapshot to a temporary file first, so readers never see a partial one."""
+        snapshot = {
+            "version": SNAPSHOT_VERSION,
+            "target": target,
+            "checksum": checksum,
+            "created_at": time.time(),
+            "schema": schema,
+        }
+        os.makedirs(self._directory, exist_ok=True)
+        file_descriptor, temporary_path = tempfile.mkstemp(
+            dir=self._directory, suffix=".tmp"
+        )
+        try:
+            with os.fdopen(file_descriptor, "wb") as raw_file:
+                with gzip.open(raw_file, "wt", encoding="utf-8") as snapshot_file:
+                    json.dump(snapshot, snapshot_file, default=str)
+            os.replace(temporary_path, self._path(target))
+        except BaseException:
+            try:
+                os.remove(temporary_path)
+            except OSError:
+                pass
+            raise
+
+    def _path(self, target: str) -> str:
+        # Targets may contain characters that are not valid in file names
+        name = hashlib.sha256(target.encode()).hexdigest()[:32]
+        return os.path.join(self._directory, f"schema-{name}.json.gz")
@@ -0,0 +1,63 @@
+import threading
+from typing import Callable, Hashable
+from src.infrastructure.metrics import MetricsRegistry
+from src.infrastructure.tracing import Tracer
+from src.utils import Singleton
+
+
+class _Call:
+    """A computation in flight, and its outcome once done."""
+
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(metaclass=Singleton):
+    """
+    Coalesces concurrent identical calls: while a call with a given flight name and key runs,
+    other callers with the same name and key wait for it and share its result or exception
+    instead of running the same work again. Nothing is kept once the call finishes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._metrics = MetricsRegistry()
+
+    def do(self, name: str, key: Hashable, function: Callable) -> tuple:
+        """Run the function, or wait for the identical call in flight.
+        Returns the result and whether it was shared from another caller."""
+        call_key = (name, key)
+        with self._lock:
+            call = self._calls.get(call_key)
+            is_leader = call is None
+            if is_leader:
+                call = _Call()
+                self._calls[call_key] = call
+
+        self._metrics.increment(
+            "text2sql_single_flight_calls_total",
+            flight=name,
+            role="leader" if is_leader else "coalesced",
+        )
+        if not is_leader:
+            with Tracer.span("single_flight_wait", flight=name):
+                call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = function()
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[call_key]
+            call.done.set()
@@ -0,0 +1,187 @@
+import re
+
+# Statements that change data, schema or server state. SELECT ... INTO creates a table.
+_WRITE_KEYWORDS = re.compile(
+    r"\b(INSERT|UPDATE|DELETE|MERGE|DROP|ALTER|CREATE|TRUNCATE|EXEC|EXECUTE|"
+    r"GRANT|REVOKE|DENY|INTO|BACKUP|RESTORE|DBCC|SHUTDOWN|KILL|USE|SET)\b",
+    re.IGNORECASE,
+)
+_LITERAL_OR_COMMENT = re.compile(
+    r"'(?:[^']|'')*'|\[[^\]]*\]|\"[^\"]*\"|--[^\n]*|/\*.*?\*/", re.DOTALL
+)
+_STRING_OR_COMMENT = re.compile(r"'(?:[^']|'')*'|--[^\n]*|/\*.*?\*/", re.DOTALL)
+_IDENTIFIER = r"(?:\[[^\]]+\]|\"[^\"]+\"|[A-Za-z_#@][\w#@$]*)"
+_TABLE_REFERENCE = re.compile(
+    rf"\b(?:FROM|JOIN)\s+({_IDENTIFIER}(?:\s*\.\s*{_IDENTIFIER}){{0,3}})", re.IGNORECASE
+)
+_CTE_NAME = re.compile(
+    rf"(?:\bWITH|,)\s*({_IDENTIFIER})\s*(?:\([^)]*\))?\s*AS\s*\(", re.IGNORECASE
+)
+_IDENTIFIER_PART = re.compile(_IDENTIFIER)
+# Parentheses that hold table sources: subqueries, and joins nested after FROM, JOIN, APPLY or a comma.
+# Other parentheses are function calls such as TRIM(' ' FROM name), whose FROM names no table.
+_SUBQUERY_START = re.compile(r"\s*(SELECT|WITH|\()", re.IGNORECASE)
+_TABLE_SOURCE_BEFORE = re.compile(r"(\b(FROM|JOIN|APPLY)|,)\s*$", re.IGNORECASE)
+# Top-level clauses that rule out appending OFFSET ... FETCH, which must come last and cannot be combined with TOP
+_UNPAGEABLE_CLAUSES = re.compile(r"\b(TOP|OFFSET|FETCH|FOR|OPTION)\b", re.IGNORECASE)
+_ORDER_BY = re.compile(r"\bORDER\s+BY\b", re.IGNORECASE)
+# Top-level clauses that do not allow the constant ORDER BY added for pagination
+_UNORDERABLE_CLAUSES = re.compile(
+    r"\b(UNION|INTERSECT|EXCEPT|DISTINCT)\b", re.IGNORECASE
+)
+
+
+class SQLText:
+    """Text-level helpers for SQL Server queries that do not need a database round trip."""
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        """Canonical form of a query for use as a key, not for execution: comments are dropped,
+        whitespace outside literals is collapsed and trailing semicolons are removed."""
+        parts = []
+        position = 0
+        for match in _LITERAL_OR_COMMENT.finditer(query):
+            parts.append(" ".join(query[position : match.start()].split()))
+            if not match.group().startswith(("--", "/*")):
+                parts.append(match.group())
+            position = match.end()
+        parts.append(" ".join(query[position:].split()))
+
+        normalized = " ".join(part for part in parts if part)
+        return normalized.rstrip("; ").strip()
+
+    @staticmethod
+    def is_read_only(query: str) -> bool:
+        """Whether the query is a single SELECT (optionally with CTEs) that changes nothing."""
+        code = SQLText._code_only(query).strip().rstrip(";").strip()
+        if not code or ";" in code:
+            return False
+        if not re.match(r"(SELECT|WITH)\b", code, re.IGNORECASE):
+            return False
+        return _WRITE_KEYWORDS.search(code) is None
+
+    @staticmethod
+    def referenced_tables(query: str) -> list[str]:
+        """Names of the tables and views after FROM and JOIN, as "schema.table" or "table".
+        CTEs, subqueries, table-valued functions and FROM inside function calls are left out.
+        """
+        code = _STRING_OR_COMMENT.sub(lambda match: " " * len(match.group()), query)
+        cte_names = {SQLText._unquote(name).lower() for name in _CTE_NAME.findall(code)}
+        enclosing = SQLText._enclosing_parentheses(SQLText._code_only(query))
+
+        tables = []
+        for match in _TABLE_REFERENCE.finditer(code):
+            if code[match.end() :].lstrip().startswith("("):
+                continue
+            opening = enclosing[match.start()]
+            if (
+                opening is not None
+                and not _SUBQUERY_START.match(code, opening + 1)
+                and not _TABLE_SOURCE_BEFORE.search(code, 0, opening)
+            ):
+                continue
+            parts = [
+                SQLText._unquote(part)
+                for part in _IDENTIFIER_PART.findall(match.group(1))
+            ]
+            name = ".".join(parts[-2:])
+            if name.lower() not in cte_names and name not in tables:
+                tables.append(name)
+        return tables
+
+    @staticmethod
+    def paginate(query: str, offset: int, limit: int) -> str | None:
+        """The query restricted to rows offset to offset + limit with OFFSET ... FETCH NEXT, or None when
+        it cannot be paginated on the server. Without an ORDER BY the row order is not guaranteed to
+        stay the same between pages, and set operations or DISTINCT cannot be paginated at all.
+        """
+        if not SQLText.is_read_only(query):
+            return None
+        top_level = SQLText._top_level(SQLText._code_only(query))
+        if _UNPAGEABLE_CLAUSES.search(top_level):
+            return None
+
+        order_by = ""
+        if not _ORDER_BY.search(top_level):
+            # SQL Server rejects ORDER BY (SELECT NULL) on them
+            if _UNORDERABLE_CLAUSES.search(top_level):
+                return None
+            order_by = "ORDER BY (SELECT NULL) "
+        # The clause starts on its own line, so a trailing line comment cannot swallow it
+        return (
+            f"{SQLText._strip_terminator(query)}\n"
+            f"{order_by}OFFSET {int(offset)} ROWS FETCH NEXT {int(limit)} ROWS ONLY"
+        )
+
+    @staticmethod
+    def count_query(query: str) -> str | None:
+        """A query returning the number of rows of the query as "row_count", or None when the query
+        cannot be wrapped in a derived table. Columns without a name still make the count fail.
+        """
+        if not SQLText.is_read_only(query):
+            return None
+        code = SQLText._code_only(query)
+        if re.match(r"\s*WITH\b", code, re.IGNORECASE):
+            return None
+
+        top_level = SQLText._top_level(code)
+        order_by = _ORDER_BY.search(top_level)
+        if order_by and not _UNPAGEABLE_CLAUSES.search(top_level):
+            # ORDER BY is not allowed in a derived table unless TOP or OFFSET uses it
+            query = query[: order_by.start()]
+        return (
+            f"SELECT COUNT_BIG(*) AS row_count FROM (\n"
+            f"{SQLText._strip_terminator(query)}\n) AS counted_rows"
+        )
+
+    @staticmethod
+    def _strip_terminator(query: str) -> str:
+        """The query without trailing semicolons, and without comments after them."""
+        # Comments are blanked out, literals and quoted identifiers are kept as placeholders
+        code = _LITERAL_OR_COMMENT.sub(
+            lambda match: (" " if match.group().startswith(("--", "/*")) else "x")
+            * len(match.group()),
+            query,
+        ).rstrip()
+        while code.endswith(";"):
+            code = code[:-1].rstrip()
+        return query[: len(code)].strip()
+
+    @staticmethod
+    def _top_level(code: str) -> str:
+        """The code with everything inside parentheses blanked out, positions unchanged."""
+        characters = list(code)
+        depth = 0
+        for index, character in enumerate(characters):
+            if character == "(":
+                depth += 1
+            elif character == ")":
+                depth = max(0, depth - 1)
+            elif depth:
+                characters[index] = " "
+        return "".join(characters)
+
+    @staticmethod
+    def _enclosing_parentheses(code: str) -> list[int | None]:
+        """For every position of the code, the position of the innermost open parenthesis around it."""
+        enclosing = []
+        openings = []
+        for index, character in enumerate(code):
+            if character == ")" and openings:
+                openings.pop()
+            enclosing.append(openings[-1] if openings else None)
+            if character == "(":
+                openings.append(index)
+        return enclosing
+
+    @staticmethod
+    def _unquote(identifier: str) -> str:
+        if identifier[:1] in ("[", '"'):
+            return identifier[1:-1]
+        return identifier
+
+    @staticmethod
+    def _code_only(query: str) -> str:
+        """The query with string literals, quoted identifiers and comments blanked out,
+        positions unchanged."""
+        return _LITERAL_OR_COMMENT.sub(lambda match: " " * len(match.group()), query)
@@ -0,0 +1,188 @@
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+from src.infrastructure.metrics import MetricsRegistry
+
+STAGE_DURATION_METRIC = "text2sql_stage_duration_seconds"
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """A timed stage of a request, with attributes such as token counts."""
+
+    def __init__(self, name: str, parent_id: str | None, attributes: dict):
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes = dict(attributes)
+        self.status = "ok"
+        self.start_unix_ns = time.time_ns()
+        self._start = time.perf_counter()
+        self.duration = None
+
+    def set_attribute(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def end(self) -> None:
+        self.duration = time.perf_counter() - self._start
+
+
+class Trace:
+    """Collects the spans of one request."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.trace_id = os.urandom(16).hex()
+        self._lock = threading.Lock()
+        self._spans = []
+        self.root = self.add_span(name, None, {})
+
+    def add_span(self, name: str, parent_id: str | None, attributes: dict) -> Span:
+        span = Span(name, parent_id, attributes)
+        with self._lock:
+            self._spans.append(span)
+        return span
+
+    def children(self, span: Span) -> list[Span]:
+        with self._lock:
+            return [child for child in self._spans if child.parent_id == span.span_id]
+
+    def to_dict(self) -> dict:
+        """Plain-data view of the trace, span offsets relative to the start of the request."""
+        with self._lock:
+            spans = list(self._spans)
+
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "start_unix_ns": self.root.start_unix_ns,
+            "duration_ms": self._milliseconds(self.root.duration),
+            "spans": [
+                {
+                    "name": span.name,
+                    "span_id": span.span_id,
+                    "parent_id": span.parent_id,
+                    "start_ms": (span.start_unix_ns - self.root.start_unix_ns) / 1e6,
+                    "duration_ms": self._milliseconds(span.duration),
+                    "status": span.status,
+                    "attributes": span.attributes,
+                }
+                for span in spans
+            ],
+        }
+
+    @staticmethod
+    def _milliseconds(duration: float | None) -> float | None:
+        return None if duration is None else duration * 1000
+
+
+class Tracer:
+    """Records per-stage spans for the request running in the current context."""
+
+    @staticmethod
+    @contextmanager
+    def trace(name: str) -> Iterator[Trace]:
+        """Start a trace; spans opened inside it, in this context, are attached to it."""
+        trace = Trace(name)
+        trace_token = _current_trace.set(trace)
+        span_token = _current_span.set(trace.root)
+        try:
+            yield trace
+        except Exception:
+            trace.root.status = "error"
+            raise
+        finally:
+            trace.root.end()
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)
+
+    @staticmethod
+    @contextmanager
+    def span(name: str, **attributes) -> Iterator[Span]:
+        """Time a stage. Outside a trace the span is only recorded in the stage metrics."""
+        trace = _current_trace.get()
+        parent = _current_span.get()
+        if trace is None:
+            span = Span(name, None, attributes)
+        else:
+            span = trace.add_span(name, parent.span_id if parent else None, attributes)
+
+        token = _current_span.set(span)
+        try:
+            yield span
+        except Exception as e:
+            span.status = "error"
+            span.set_attribute("error", str(e))
+            raise
+        finally:
+            span.end()
+            _current_span.reset(token)
+            MetricsRegistry().observe(
+                STAGE_DURATION_METRIC, span.duration, stage=name, status=span.status
+            )
+
+    @staticmethod
+    def child_spans(span: Span) -> list[Span]:
+        """Spans opened directly inside a span of the current trace, empty outside a trace."""
+        trace = _current_trace.get()
+        if trace is None:
+            return []
+        return trace.children(span)
+
+    @staticmethod
+    def to_otel(trace: dict, service_name: str = "text2sql") -> dict:
+        """Convert a trace dict to the OpenTelemetry OTLP/JSON trace format."""
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            Tracer._otel_attribute("service.name", service_name)
+                        ]
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": service_name},
+                            "spans": [
+                                Tracer._otel_span(trace, span)
+                                for span in trace["spans"]
+                            ],
+                        }
+                    ],
+                }
+            ]
+        }
+
+    @staticmethod
+    def _otel_span(trace: dict, span: dict) -> dict:
+        start_ns = trace["start_unix_ns"] + int(span["start_ms"] * 1e6)
+        return {
+            "traceId": trace["trace_id"],
+            "spanId": span["span_id"],
+            "parentSpanId": span["parent_id"] or "",
+            "name": span["name"],
+            "kind": 1,
+            "startTimeUnixNano": str(start_ns),
+            "endTimeUnixNano": str(start_ns + int((span["duration_ms"] or 0) * 1e6)),
+            "attributes": [
+                Tracer._otel_attribute(key, value)
+                for key, value in span["attributes"].items()
+            ],
+            # OTLP status codes: 1 is OK, 2 is ERROR
+            "status": {"code": 2 if span["status"] == "error" else 1},
+        }
+
+    @staticmethod
+    def _otel_attribute(key: str, value) -> dict:
+        if isinstance(value, bool):
+            return {"key": key, "value": {"boolValue": value}}
+        if isinstance(value, int):
+            return {"key": key, "value": {"intValue": str(value)}}
+        if isinstance(value, float):
+            return {"key": key, "value": {"doubleValue": value}}
+        return {"key": key, "value": {"stringValue": str(value)}}
@@ -1,21 +1,51 @@
-import pandas as pd
+import json
+import os
+import tempfile
+
 import streamlit as st
 
-from src.services.database_schema_service import DatabaseSchemaService
+from src.infrastructure.config import EnvConfig
+from src.infrastructure.metrics import MetricsRegistry
+from src.infrastructure.sql_text import SQLText
+from src.infrastructure.tracing import Tracer
+from src.services.database_registry import DatabaseRegistry
 from src.services.llm_text_to_sql_service import LLMTextToSQLService
+from src.services.query_result_service import EXPORT_FORMATS
+
+# Session state keys, results are kept across the reruns triggered by paging
+_LAST_RESULT_KEY = "last_result"
+_PAGE_KEY = "result_page"
+_PAGE_RESULT_KEY = "result_page_data"
+_ROW_COUNT_KEY = "result_row_count"
+_EXPORT_KEY = "result_export"
 
 
 class SidebarSchemaDisplay:
-    """Displays the database schema in the sidebar."""
+    """Lets the user pick a database and displays its schema in the sidebar."""
 
     @staticmethod
-    def render() -> None:
+    def render() -> str:
+        """Render the sidebar and return the selected database."""
+        database_registry = DatabaseRegistry()
         with st.sidebar:
+            database_name = SidebarSchemaDisplay._display_and_get_database(
+                database_registry.database_names
+            )
             SidebarSchemaDisplay._set_sidebar_header()
             try:
-                st.json(DatabaseSchemaService().retrieve(), expanded=False)
+                database_schema_service = database_registry.get(
+                    database_name
+                ).database_schema_service
+                st.json(database_schema_service.retrieve().to_json(), expanded=False)
             except Exception as e:
                 st.error(f"Error loading schema: {str(e)}")
+        return database_name
+
+    @staticmethod
+    def _display_and_get_database(database_names: list[str]) -> str:
+        if len(database_names) == 1:
+            return database_names[0]
+        return st.selectbox("Database", database_names, key="database_name")
 
     @staticmethod
     def _set_sidebar_header() -> None:
@@ -68,44 +98,121 @@ class SQLQueryProcessor:
     def __init__(self):
         self._llm_service = LLMTextToSQLService()
 
-    def process_query(self, natural_language_query: str, use_rag: bool) -> None:
+    def warm_up(self, database_name: str) -> None:
+        """Prepare RAG generation in the background while the user types a query."""
+        self._llm_service.set_database(database_name)
+        self._llm_service.prepare_rag_in_background()
+
+    def process_query(
+        self, natural_language_query: str, use_rag: bool, database_name: str
+    ) -> None:
         with st.spinner("Processing..."):
             try:
-                # Set the generation mode
+                # Set the generation mode and the database
                 self._llm_service.set_generation_mode(use_rag)
-
-                # Display the selected mode
-                mode_display = "RAG" if use_rag else "Regular"
-                st.info(f"Using {mode_display} generation mode")
+                self._llm_service.set_database(database_name)
 
                 # Use the generate_and_execute_sql method that handles refinement
                 result = self._llm_service.generate_and_execute_sql(
                     natural_language_query
                 )
 
-                # Display the SQL query
-                st.success("Generated SQL Query")
-                st.code(result["query"], language="sql")
-
-                # Display refinement information if the query was refined
-                if result["refined"]:
-                    self._display_original_query(result)
-
-                self._display_results(result["result"])
-                self._display_executed_prompt()
+                # Keep the result across reruns, so paging through it does not generate it again
+                st.session_state[_LAST_RESULT_KEY] = {
+                    **result,
+                    "use_rag": use_rag,
+                    "database_name": database_name,
+                    "executed_prompt": self._llm_service.get_last_executed_prompt(),
+                }
+                ResultPager.reset()
 
             except Exception as e:
+                st.session_state.pop(_LAST_RESULT_KEY, None)
                 st.error(f"Error: {str(e)}")
 
-    def _display_executed_prompt(self) -> None:
+    def display_last_result(self) -> None:
+        result = st.session_state.get(_LAST_RESULT_KEY)
+        if result is None:
+            return
+
+        # Display the selected mode
+        mode_display = "RAG" if result["use_rag"] else "Regular"
+        st.info(
+            f"Using {mode_display} generation mode on {result['database_name'] or 'the default database'}"
+        )
+
+        # Display the SQL query
+        st.success("Generated SQL Query")
+        st.code(result["query"], language="sql")
+        if result.get("wasted_candidates"):
+            st.caption(
+                f"{result['wasted_candidates']} speculative candidate(s) did not win"
+            )
+
+        # Display refinement information if the query was refined
+        if result["refined"]:
+            self._display_original_query(result)
+
+        ResultPager(result["query"], result["result"], result["database_name"]).render()
+        self._display_trace(result["trace"])
+        self._display_executed_prompt(result["executed_prompt"])
+
+    @staticmethod
+    def _display_executed_prompt(last_prompt: str) -> None:
         with st.expander("View last executed prompt", expanded=False):
-            last_prompt = self._llm_service.get_last_executed_prompt()
             if last_prompt:
                 st.markdown("##### Prompt sent to LLM")
                 st.text(last_prompt)
             else:
                 st.info("No prompt has been executed yet")
 
+    @staticmethod
+    def _display_trace(trace: dict) -> None:
+        import altair as alt  # Deferred, only needed once there are results to show
+        import pandas as pd
+
+        with st.expander(
+            f"Timing breakdown ({trace['duration_ms']:.0f} ms)", expanded=False
+        ):
+            parents = {span["span_id"]: span["parent_id"] for span in trace["spans"]}
+            rows = []
+            for position, span in enumerate(trace["spans"], start=1):
+                if span["duration_ms"] is None:
+                    continue
+                depth, parent_id = 0, span["parent_id"]
+                while parent_id:
+                    depth, parent_id = depth + 1, parents.get(parent_id)
+                rows.append(
+                    {
+                        "stage": f"{position:02d} {'· ' * depth}{span['name']}",
+                        "start_ms": span["start_ms"],
+                        "end_ms": span["start_ms"] + span["duration_ms"],
+                        "duration_ms": round(span["duration_ms"], 2),
+                        "status": span["status"],
+                        "attributes": json.dumps(span["attributes"], default=str),
+                    }
+                )
+
+            waterfall = (
+                alt.Chart(pd.DataFrame(rows))
+                .mark_bar()
+                .encode(
+                    x=alt.X("start_ms:Q", title="Milliseconds since request start"),
+                    x2="end_ms:Q",
+                    y=alt.Y("stage:N", sort=None, title=None),
+                    color=alt.Color("status:N", legend=None),
+                    tooltip=["stage", "duration_ms", "status", "attributes"],
+                )
+            )
+            st.altair_chart(waterfall, use_container_width=True)
+
+            st.download_button(
+                "Download trace (OpenTelemetry JSON)",
+                data=json.dumps(Tracer.to_otel(trace), indent=2),
+                file_name=f"trace-{trace['trace_id']}.json",
+                mime="application/json",
+            )
+
     @staticmethod
     def _display_original_query(result: dict) -> None:
         with st.expander("Query was refined due to errors", expanded=False):
@@ -117,16 +224,146 @@ class SQLQueryProcessor:
             st.markdown("##### Error Message")
             st.code(result["error_message"])
 
+
+class ResultPager:
+    """Shows a query result one page at a time, fetching each page from the database on demand.
+    The row count and exports are only computed when asked for."""
+
+    def __init__(self, query: str, first_page: dict, database_name: str):
+        self._query = query
+        self._first_page = first_page
+        self._query_result_service = (
+            DatabaseRegistry().get(database_name).query_result_service
+        )
+
     @staticmethod
-    def _display_results(result: dict) -> None:
+    def reset() -> None:
+        st.session_state[_PAGE_KEY] = 0
+        for key in (_PAGE_RESULT_KEY, _ROW_COUNT_KEY, _EXPORT_KEY):
+            st.session_state.pop(key, None)
+
+    def render(self) -> None:
+        import pandas as pd  # Deferred, only needed once there are results to show
+
         st.success("Query Results")
 
-        if result.get("rows"):
-            df = pd.DataFrame(result.get("rows", []))
-            st.dataframe(df)
-            st.info(f"Execution time: {result.get('execution_time', 0):.3f} seconds")
-        else:
+        try:
+            page = self._current_page()
+        except Exception as e:
+            st.error(f"Error: {str(e)}")
+            return
+
+        if not page.get("rows"):
             st.info("Query executed successfully, but returned no results")
+            return
+
+        st.dataframe(pd.DataFrame(page["rows"]))
+        if page.get("cached"):
+            st.info(
+                f"Served from the result cache, computed {page['cache_age']:.0f} seconds ago "
+                f"in {page.get('execution_time', 0):.3f} seconds"
+            )
+        else:
+            st.info(f"Execution time: {page.get('execution_time', 0):.3f} seconds")
+
+        self._display_navigation(page)
+        if SQLText.is_read_only(self._query):
+            self._display_export()
+
+    def _current_page(self) -> dict:
+        page_number = st.session_state.get(_PAGE_KEY, 0)
+        first_page = self._first_page
+        if not first_page["paginated"]:
+            # The whole result is already here, only one page of it goes to the browser
+            start = page_number * first_page["page_size"]
+            end = start + first_page["page_size"]
+            return {
+                **first_page,
+                "rows": first_page["rows"][start:end],
+                "page": page_number,
+                "has_next_page": len(first_page["rows"]) > end,
+                "row_count": len(first_page["rows"]),
+            }
+        if page_number == 0:
+            return first_page
+
+        page = st.session_state.get(_PAGE_RESULT_KEY)
+        if page is None or page["page"] != page_number:
+            page = self._query_result_service.fetch_page(self._query, page_number)
+            st.session_state[_PAGE_RESULT_KEY] = page
+        return page
+
+    def _display_navigation(self, page: dict) -> None:
+        previous_column, position_column, next_column = st.columns([1, 4, 1])
+        previous_column.button(
+            "Previous",
+            disabled=page["page"] == 0,
+            on_click=ResultPager._go_to_page,
+            args=(page["page"] - 1,),
+        )
+        next_column.button(
+            "Next",
+            disabled=not page["has_next_page"],
+            on_click=ResultPager._go_to_page,
+            args=(page["page"] + 1,),
+        )
+
+        first_row = page["page"] * page["page_size"] + 1
+        last_row = first_row + len(page["rows"]) - 1
+        row_count = page.get("row_count", st.session_state.get(_ROW_COUNT_KEY))
+        if row_count is not None:
+            position_column.caption(f"Rows {first_row}-{last_row} of {row_count}")
+            return
+
+        position_column.caption(f"Rows {first_row}-{last_row}")
+        position_column.button("Count rows", on_click=self._count_rows)
+
+    def _count_rows(self) -> None:
+        try:
+            st.session_state[_ROW_COUNT_KEY] = self._query_result_service.count_rows(
+                self._query
+            )
+        except Exception as e:
+            st.error(f"Error counting rows: {str(e)}")
+
+    @staticmethod
+    def _go_to_page(page_number: int) -> None:
+        st.session_state[_PAGE_KEY] = max(0, page_number)
+
+    def _display_export(self) -> None:
+        with st.expander("Export full result", expanded=False):
+            file_format = st.selectbox("Format", EXPORT_FORMATS)
+            if st.button("Prepare export"):
+                try:
+                    st.session_state[_EXPORT_KEY] = self._export(file_format)
+                except Exception as e:
+                    st.error(f"Error exporting: {str(e)}")
+
+            export = st.session_state.get(_EXPORT_KEY)
+            if export and export["format"] == file_format:
+                with open(export["path"], "rb") as export_file:
+                    st.download_button(
+                        f"Download {export['rows']} rows",
+                        data=export_file,
+                        file_name=f"result.{file_format}",
+                    )
+
+    def _export(self, file_format: str) -> dict:
+        """Stream the result into a temporary file, replacing the previous export of the session."""
+        previous_export = st.session_state.pop(_EXPORT_KEY, None)
+        if previous_export:
+            try:
+                os.remove(previous_export["path"])
+            except OSError:
+                pass
+
+        with tempfile.NamedTemporaryFile(
+            suffix=f".{file_format}", delete=False
+        ) as export_file:
+            rows = self._query_result_service.export(
+                self._query, file_format, export_file
+            )
+        return {"path": export_file.name, "format": file_format, "rows": rows}
 
 
 class UI:
@@ -136,6 +373,13 @@ class UI:
         self._sidebar_schema_display = SidebarSchemaDisplay()
         self._query_input = QueryInput()
         self._query_processor = SQLQueryProcessor()
+        self._start_metrics_endpoint()
+
+    @staticmethod
+    def _start_metrics_endpoint() -> None:
+        metrics_port = EnvConfig().metrics_port
+        if metrics_port:
+            MetricsRegistry().start_http_server(metrics_port)
 
     @staticmethod
     def _configure_page() -> None:
@@ -182,8 +426,13 @@ class UI:
     def render(self) -> None:
         UI._configure_page()
 
-        self._sidebar_schema_display.render()
+        database_name = self._sidebar_schema_display.render()
         natural_language_query, use_rag = self._query_input.render()
 
         if natural_language_query:
-            self._query_processor.process_query(natural_language_query, use_rag)
+            self._query_processor.process_query(
+                natural_language_query, use_rag, database_name
+            )
+        self._query_processor.display_last_result()
+
+        self._query_processor.warm_up(database_name)
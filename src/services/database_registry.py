@@ -0,0 +1,151 @@
+import threading
+from collections import OrderedDict
+from typing import Callable
+from src.infrastructure.config import EnvConfig
+from src.infrastructure.database import Database
+from src.infrastructure.metrics import MetricsRegistry
+from src.services.database_schema_service import DatabaseSchemaService
+from src.services.query_result_service import QueryResultService
+from src.utils import Singleton
+
+
+class DatabaseContext:
+    """The connection pool, schema and vector index of one database, created on first use."""
+
+    def __init__(self, database: Database, embeddings=None):
+        self.database = database
+        self.database_schema_service = DatabaseSchemaService(database)
+        self.query_result_service = QueryResultService(database)
+        self._embeddings = embeddings
+        self._lock = threading.Lock()
+        self._schema_embedding_service = None
+        self._schema_excerption_service = None
+        self._rag_warm_up = None
+
+    @property
+    def schema_embedding_service(self):
+        with self._lock:
+            if self._schema_embedding_service is None:
+                # Deferred, the RAG stack pulls in langchain, faiss and numpy
+                from src.services.schema_embedding_service import (
+                    SchemaEmbeddingService,
+                )
+
+                self._schema_embedding_service = SchemaEmbeddingService(
+                    self.database_schema_service, self._embeddings
+                )
+            return self._schema_embedding_service
+
+    @property
+    def schema_excerption_service(self):
+        schema_embedding_service = self.schema_embedding_service
+        with self._lock:
+            if self._schema_excerption_service is None:
+                from src.services.schema_excerption_service import (
+                    SchemaExcerptionService,
+                )
+
+                self._schema_excerption_service = SchemaExcerptionService(
+                    self.database_schema_service, schema_embedding_service
+                )
+            return self._schema_excerption_service
+
+    def prepare_rag_in_background(self) -> None:
+        """Import the RAG stack and start building the vector index without blocking the caller."""
+        with self._lock:
+            if self._schema_excerption_service is not None or self._rag_warm_up:
+                return
+            self._rag_warm_up = threading.Thread(
+                target=self._warm_up_rag, name="rag-warm-up", daemon=True
+            )
+        self._rag_warm_up.start()
+
+    def _warm_up_rag(self) -> None:
+        try:
+            self.schema_excerption_service
+        except Exception:
+            # The error is raised again when RAG generation is first used
+            pass
+
+    @property
+    def memory_bytes(self) -> int:
+        """Approximate memory held by the schema and the vector index."""
+        memory_bytes = self.database_schema_service.memory_bytes
+        if self._schema_embedding_service is not None:
+            memory_bytes += self._schema_embedding_service.memory_bytes
+        return memory_bytes
+
+    def close(self) -> None:
+        self.database.close()
+
+
+class DatabaseRegistry(metaclass=Singleton):
+    """
+    The databases a deployment serves, keyed by connection target. Each database gets its own
+    DatabaseContext when it is first asked for. When the loaded schemas and indexes exceed the
+    memory budget, the least recently used databases are unloaded and load again on next use.
+    The budget is checked whenever a database is asked for, so memory grows with the number of
+    databases in use rather than the number configured.
+    """
+
+    def __init__(
+        self,
+        database_factory: Callable[[str], Database] | None = None,
+        embeddings=None,
+    ):
+        self._config = EnvConfig()
+        self._database_factory = database_factory or Database
+        # Used by every database instead of an OpenAI embeddings client when given
+        self._embeddings = embeddings
+        self._max_bytes = self._config.database_registry_max_bytes
+        self._lock = threading.Lock()
+        self._contexts = OrderedDict()
+        self._metrics = MetricsRegistry()
+
+    @property
+    def database_names(self) -> list[str]:
+        """The configured connection targets, the default first."""
+        return self._config.db_names
+
+    @property
+    def default_database_name(self) -> str:
+        return self.database_names[0]
+
+    def get(self, database_name: str | None = None) -> DatabaseContext:
+        """The context of a configured database, the default one when no name is given."""
+        database_name = database_name or self.default_database_name
+        if database_name not in self.database_names:
+            raise ValueError(f"Unknown database: {database_name}")
+
+        with self._lock:
+            context = self._contexts.get(database_name)
+            if context is not None:
+                self._contexts.move_to_end(database_name)
+            else:
+                context = DatabaseContext(
+                    self._database_factory(database_name), self._embeddings
+                )
+                self._contexts[database_name] = context
+                self._metrics.increment(
+                    "text2sql_database_registry_loads_total", database=database_name
+                )
+            evicted = self._evict_over_budget()
+
+        for evicted_context in evicted:
+            evicted_context.close()
+        return context
+
+    def _evict_over_budget(self) -> list[DatabaseContext]:
+        """Unload least recently used databases until the rest fit the budget, keeping the one
+        just used. Must be called with the lock held."""
+        sizes = {name: context.memory_bytes for name, context in self._contexts.items()}
+        total_bytes = sum(sizes.values())
+        evicted = []
+        while total_bytes > self._max_bytes and len(self._contexts) > 1:
+            database_name, context = self._contexts.popitem(last=False)
+            total_bytes -= sizes[database_name]
+            evicted.append(context)
+            self._metrics.increment(
+                "text2sql_database_registry_evictions_total", database=database_name
+            )
+        return evicted
@@ -1,106 +1,243 @@
+import json
+import threading
+import time
 from src.infrastructure.config import EnvConfig
 from src.infrastructure.database import Database
 from src.infrastructure.exceptions import SchemaError
-from src.utils import Singleton
+from src.infrastructure.metrics import MetricsRegistry
+from src.infrastructure.schema_snapshot import SchemaSnapshot
+from src.infrastructure.single_flight import SingleFlight
+from src.infrastructure.tracing import Tracer
+from src.services.schema_model import SchemaModel
 
+# Seconds before a revalidation that found the database unreachable is retried, doubled up to the maximum
+_REVALIDATION_RETRY_SECONDS = 5
+_REVALIDATION_MAX_RETRY_SECONDS = 300
 
-class DatabaseSchemaService(metaclass=Singleton):
-    """Service for retrieving and managing database schema information."""
 
-    def __init__(self):
-        self._database = Database()
+class DatabaseSchemaService:
+    """
+    Service for retrieving and managing the schema information of one database.
+    When a snapshot directory is configured, the built schema is also written to disk. A new process
+    starts from the snapshot without querying the catalog and revalidates it in the background
+    against a cheap catalog checksum, so startup works even while the database is unreachable.
+    Until a revalidation reaches the database, later retrievals retry it with a growing delay.
+    """
+
+    def __init__(self, database: Database):
+        self._database = database
         self._cached_schema = None
         self._config = EnvConfig()
         self._schema_retrieval_query_result = None
+        self._memory_bytes = 0
+        self._schema_version = 0
+        self._snapshot = (
+            SchemaSnapshot(self._config.schema_snapshot_dir)
+            if self._config.schema_snapshot_dir
+            else None
+        )
+        self._snapshot_checksum = None
+        self._lock = threading.Lock()
+        self._revalidation = None
+        self._revalidation_pending = False
+        self._revalidation_retry_at = 0.0
+        self._revalidation_retry_seconds = _REVALIDATION_RETRY_SECONDS
+        self._metrics = MetricsRegistry()
 
-    def retrieve(self, use_cache: bool = True) -> dict:
-        """Query the database for schema information. Cache it and return as a dictionary."""
-        try:
-            if use_cache and self._cached_schema is not None:
-                return self._cached_schema
+    def retrieve(self, use_cache: bool = True) -> SchemaModel:
+        """Query the database for schema information. Cache it and return it as a SchemaModel,
+        which reads like a dict of tables. Concurrent retrievals of the same database share one
+        round of catalog queries.
+        """
+        if use_cache and self._cached_schema is not None:
+            if self._revalidation_pending:
+                with self._lock:
+                    self._revalidate_in_background()
+            return self._cached_schema
 
-            # Get table and column information
-            columns_query_result = self._database.execute_query(
-                self._schema_retrieval_query
-            )
-            schema = self._construct_schema_as_dict(columns_query_result)
+        if use_cache:
+            with self._lock:
+                # Another thread may have loaded it while this one waited
+                if self._cached_schema is not None:
+                    return self._cached_schema
+                if self._load_snapshot():
+                    self._revalidate_in_background()
+                    return self._cached_schema
 
-            # Get relationship information
-            relationships_query_result = self._database.execute_query(
-                self._relationships_retrieval_query
-            )
-            schema = self._add_relationships_to_schema(
-                schema, relationships_query_result
+        try:
+            schema, shared = SingleFlight().do(
+                "schema_refresh", self._database.target, self._refresh
             )
-
-            self._cached_schema = schema
-            return schema
-
         except Exception as e:
             raise SchemaError(f"Failed to retrieve schema information: {str(e)}")
 
+        if shared and self._cached_schema is not schema:
+            # Refreshed by another service instance for the same database
+            with self._lock:
+                self._set_schema(schema)
+        return schema
+
+    def _refresh(self, checksum: str | None = None) -> SchemaModel:
+        """Retrieve the schema from the catalog, cache it and write its snapshot."""
+        if checksum is None:
+            checksum = self._catalog_checksum()
+        schema = self._retrieve_from_database()
+        with self._lock:
+            self._set_schema(schema)
+            self._save_snapshot(schema, checksum)
+        return schema
+
+    def _retrieve_from_database(self) -> SchemaModel:
+        # Get table and column information
+        columns_query_result = self._database.execute_query(
+            self._schema_retrieval_query, use_cache=False
+        )
+        schema = self._construct_schema(columns_query_result)
+
+        # Get relationship information
+        relationships_query_result = self._database.execute_query(
+            self._relationships_retrieval_query, use_cache=False
+        )
+        return self._add_relationships_to_schema(schema, relationships_query_result)
+
+    def _set_schema(self, schema: SchemaModel) -> None:
+        self._cached_schema = schema
+        self._memory_bytes = schema.estimate_size()
+        self._schema_version += 1
+
+    def _load_snapshot(self) -> bool:
+        """Use the snapshot of this database as the cached schema, if there is one."""
+        if self._snapshot is None:
+            return False
+
+        schema = None
+        with Tracer.span("schema_snapshot_load") as span:
+            snapshot = self._snapshot.load(self._database.target)
+            if snapshot is not None:
+                try:
+                    schema = SchemaModel.from_compact(snapshot["schema"])
+                    checksum = snapshot["checksum"]
+                except (KeyError, TypeError, ValueError):
+                    # A corrupt snapshot is rebuilt from the catalog like a missing one
+                    schema = None
+            span.set_attribute("found", schema is not None)
+        self._metrics.increment(
+            "text2sql_schema_snapshot_total",
+            outcome="loaded" if schema is not None else "missing",
+        )
+        if schema is None:
+            return False
+
+        self._set_schema(schema)
+        self._snapshot_checksum = checksum
+        self._revalidation_pending = True
+        return True
+
+    def _save_snapshot(self, schema: SchemaModel, checksum: str | None) -> None:
+        if self._snapshot is None:
+            return
+        try:
+            self._snapshot.save(self._database.target, schema.to_compact(), checksum)
+            self._snapshot_checksum = checksum
+        except OSError:
+            # The schema still works from memory, the next process queries the catalog again
+            pass
+
+    def _revalidate_in_background(self) -> None:
+        """Start a revalidation unless one is running or the retry delay has not passed.
+        Must be called with the lock held."""
+        if (
+            not self._revalidation_pending
+            or (self._revalidation is not None and self._revalidation.is_alive())
+            or time.monotonic() < self._revalidation_retry_at
+        ):
+            return
+        self._revalidation = threading.Thread(
+            target=self._revalidate, name="schema-revalidation", daemon=True
+        )
+        self._revalidation.start()
+
+    def _revalidate(self) -> None:
+        """Rebuild the schema from the catalog when its checksum no longer matches the snapshot."""
+        try:
+            checksum = self._catalog_checksum()
+            if checksum is not None and checksum == self._snapshot_checksum:
+                outcome = "valid"
+            else:
+                SingleFlight().do(
+                    "schema_refresh",
+                    self._database.target,
+                    lambda: self._refresh(checksum),
+                )
+                outcome = "stale"
+        except Exception:
+            # The database is unreachable, keep serving the snapshot and retry later
+            outcome = "unreachable"
+
+        with self._lock:
+            if outcome == "unreachable":
+                self._revalidation_retry_at = (
+                    time.monotonic() + self._revalidation_retry_seconds
+                )
+                self._revalidation_retry_seconds = min(
+                    2 * self._revalidation_retry_seconds,
+                    _REVALIDATION_MAX_RETRY_SECONDS,
+                )
+            else:
+                self._revalidation_pending = False
+        self._metrics.increment("text2sql_schema_snapshot_total", outcome=outcome)
+
+    def _catalog_checksum(self) -> str | None:
+        """A cheap fingerprint of the tables, views and foreign keys, None when snapshots are off."""
+        if self._snapshot is None:
+            return None
+        result = self._database.execute_query(
+            self._catalog_checksum_query, use_cache=False
+        )
+        return json.dumps(list(result["rows"][0].values()), default=str)
+
+    @property
+    def schema_version(self) -> int:
+        """Incremented whenever the cached schema is replaced, e.g. after a stale snapshot."""
+        return self._schema_version
+
+    @property
+    def memory_bytes(self) -> int:
+        """Approximate memory held by the cached schema, 0 before it is retrieved."""
+        if self._cached_schema is None:
+            return self._memory_bytes
+        return self._memory_bytes + self._cached_schema.json_bytes
+
     @staticmethod
-    def _construct_schema_as_dict(query_result: dict) -> dict:
-        """Construct the schema as a dictionary from the query result."""
-        schema = {}
+    def _construct_schema(query_result: dict) -> SchemaModel:
+        """Construct the schema model from the query result."""
+        schema = SchemaModel()
 
         for row in query_result["rows"]:
-            table_name = row["TABLE_NAME"]
-            table_schema_name = row["TABLE_SCHEMA"]
-            column_name = row["COLUMN_NAME"]
-            data_type = row["DATA_TYPE"]
-            char_max_len = row["CHARACTER_MAXIMUM_LENGTH"]
-            is_nullable = row["IS_NULLABLE"]
-            column_default = row["COLUMN_DEFAULT"]
-            full_table_name = f"{table_schema_name}.{table_name}"
-            if full_table_name not in schema:
-                schema[full_table_name] = {
-                    "columns": {},
-                    "relationships": {"foreign_keys": [], "referenced_by": []},
-                }
-
-            schema[full_table_name]["columns"][column_name] = {
-                "data_type": data_type,
-                "character_maximum_length": char_max_len,
-                "is_nullable": is_nullable,
-                "column_default": column_default,
-            }
+            schema.add_column(
+                f"{row['TABLE_SCHEMA']}.{row['TABLE_NAME']}",
+                row["COLUMN_NAME"],
+                row["DATA_TYPE"],
+                row["CHARACTER_MAXIMUM_LENGTH"],
+                row["IS_NULLABLE"],
+                row["COLUMN_DEFAULT"],
+            )
 
         return schema
 
     @staticmethod
-    def _add_relationships_to_schema(schema: dict, relationships_result: dict) -> dict:
-        """Add relationship information to the schema."""
+    def _add_relationships_to_schema(
+        schema: SchemaModel, relationships_result: dict
+    ) -> SchemaModel:
+        """Add relationship information to the schema, on the table that contains the foreign key
+        and, as referenced by, on the table it references."""
         for row in relationships_result["rows"]:
-            fk_table_name = row["FK_TABLE_NAME"]
-            pk_table_name = row["PK_TABLE_NAME"]
-            fk_column_name = row["FK_COLUMN_NAME"]
-            pk_column_name = row["PK_COLUMN_NAME"]
-            constraint_name = row["CONSTRAINT_NAME"]
-
-            if fk_table_name not in schema or pk_table_name not in schema:
-                continue
-
-            # Add foreign key information to the table that contains the foreign key
-            foreign_key_info = {
-                "constraint_name": constraint_name,
-                "column": fk_column_name,
-                "references_table": pk_table_name,
-                "references_column": pk_column_name,
-            }
-            schema[fk_table_name]["relationships"]["foreign_keys"].append(
-                foreign_key_info
-            )
-
-            # Add reverse relationship information to the referenced table
-            referenced_by_info = {
-                "constraint_name": constraint_name,
-                "table": fk_table_name,
-                "column": fk_column_name,
-                "referenced_column": pk_column_name,
-            }
-            schema[pk_table_name]["relationships"]["referenced_by"].append(
-                referenced_by_info
+            schema.add_foreign_key(
+                row["CONSTRAINT_NAME"],
+                row["FK_TABLE_NAME"],
+                row["FK_COLUMN_NAME"],
+                row["PK_TABLE_NAME"],
+                row["PK_COLUMN_NAME"],
             )
 
         return schema
@@ -137,3 +274,18 @@ class DatabaseSchemaService(metaclass=Singleton):
                ORDER BY 
                    fk.name;
                """
+
+    @property
+    def _catalog_checksum_query(self) -> str:
+        """SQL query fingerprinting the tables, views and foreign keys. Altering, adding or dropping
+        any of them changes its modify date, count or checksum."""
+        return """
+               SELECT
+                   COUNT_BIG(*) AS OBJECT_COUNT,
+                   MAX(modify_date) AS LAST_MODIFIED,
+                   CHECKSUM_AGG(CHECKSUM(object_id, name, modify_date)) AS OBJECT_CHECKSUM
+               FROM
+                   sys.objects
+               WHERE
+                   type IN ('U', 'V', 'F');
+               """
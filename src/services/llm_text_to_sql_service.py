@@ -1,10 +1,17 @@
+import contextvars
 import json
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from src.infrastructure.config import EnvConfig
-from src.infrastructure.database import Database
+from src.infrastructure.database import QueryCancellation
 from src.infrastructure.exceptions import QueryGenerationError, QueryError
+from src.infrastructure.metrics import MetricsRegistry
 from src.infrastructure.open_ai_llm import OpenAILLM
-from src.services.database_schema_service import DatabaseSchemaService
-from src.services.schema_excerption_service import SchemaExcerptionService
+from src.infrastructure.single_flight import SingleFlight
+from src.infrastructure.sql_text import SQLText
+from src.infrastructure.tracing import Tracer
+from src.services.database_registry import DatabaseContext, DatabaseRegistry
+from src.services.schema_model import SchemaModel
 
 _GENERATION_RULES = """
 Pay special attention to the "relationships" section for each table. It contains:
@@ -26,76 +33,185 @@ Rules:
 7. Only SELECT queries are allowed
 """
 
-_DEFAULT_PROMPT_TEMPLATE = """
+# The system message only depends on the schema, so it forms a stable prefix that the
+# provider can cache across questions and refinement turns
+_SYSTEM_PROMPT_TEMPLATE = """
 You are an expert SQL assistant for Microsoft SQL Server.
 Given a natural language query, generate an accurate SQL query.
 
-Below is the relevant part of the database schema (JSON format) for your reference:
-{database_schema}
-
 {generation_rules}
 
-Natural Language Query: "{natural_language_query}"
+Below is the relevant part of the database schema (JSON format) for your reference:
+{database_schema}
 """
 
-_REFINE_PROMPT_TEMPLATE = """
-You are an expert SQL assistant for Microsoft SQL Server.
-I previously asked you to generate an SQL query for the following natural language query:
-
-Natural Language Query: "{natural_language_query}"
-
-You generated this SQL query:
-```
-{original_query}
-```
+_QUESTION_PROMPT_TEMPLATE = 'Natural Language Query: "{natural_language_query}"'
 
-But when executing it, the following error occurred:
+_REFINE_PROMPT_TEMPLATE = """
+When executing your SQL query, the following error occurred:
 ```
 {error_message}
 ```
 
 Please fix the SQL query to address this error.
+{additional_schema}"""
 
-{generation_rules}
-
-Below is the relevant part of the database schema (JSON format) for your reference:
+_ADDITIONAL_SCHEMA_TEMPLATE = """
+These tables were not part of the schema above and may be relevant (JSON format):
 {database_schema}
 """
 
+# Catalog schemas a query may read although they are not part of the retrieved schema
+_SYSTEM_SCHEMAS = ("sys", "information_schema")
+
+# Model tiers: simple questions start on the fast model and escalate to the strong one on failure
+FAST_TIER = "fast"
+STRONG_TIER = "strong"
+
+
+class _Conversation:
+    """
+    Messages exchanged with the LLM for one question. The system message holding the rules
+    and the schema never changes, refinements only append turns, so every call of the
+    conversation repeats the same prefix.
+    """
+
+    def __init__(
+        self,
+        system_prompt: str,
+        question_prompt: str,
+        schema_tables,
+        tier: str = STRONG_TIER,
+    ):
+        self.messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": question_prompt},
+        ]
+        self.schema_tables = set(schema_tables)
+        # The model tier answering the next turn
+        self.tier = tier
+
+    def add_refinement(self, failed_query: str, refine_prompt: str) -> None:
+        self.messages.append({"role": "assistant", "content": failed_query})
+        self.messages.append({"role": "user", "content": refine_prompt})
+
+    def render(self) -> str:
+        return "\n\n".join(
+            f"[{message['role']}]\n{message['content'].strip()}"
+            for message in self.messages
+        )
+
 
 class LLMTextToSQLService:
     """Service for generating SQL queries from natural language quries using OpenAI LLM."""
 
-    def __init__(self, use_rag: bool = True):
-        self._open_ai_llm = OpenAILLM()
-        self._database = Database()
-        self._database_schema_service = DatabaseSchemaService()
-        self._schema_excerption_service = SchemaExcerptionService()
+    def __init__(
+        self,
+        use_rag: bool = True,
+        llm: OpenAILLM | None = None,
+        database_name: str | None = None,
+    ):
+        self._database_registry = DatabaseRegistry()
         self._config = EnvConfig()
         self._use_rag = use_rag
+        self._database_name = database_name
         self._last_executed_prompt = None
+        # Created on first use, so the UI can render before the LLM client exists
+        self._open_ai_llm_instance = llm
+
+    @property
+    def _open_ai_llm(self) -> OpenAILLM:
+        if self._open_ai_llm_instance is None:
+            self._open_ai_llm_instance = OpenAILLM()
+        return self._open_ai_llm_instance
+
+    def prepare_rag_in_background(self) -> None:
+        """Import the RAG stack and start building the schema index of the selected database
+        without blocking the caller."""
+        self._database_registry.get(self._database_name).prepare_rag_in_background()
 
     def generate_and_execute_sql(self, natural_language_query: str) -> dict:
-        """Generate SQL from natural language, execute it, and refine if there are errors."""
-        sql_query = self.generate_sql(natural_language_query)
+        """Generate SQL from natural language, execute it, and refine if there are errors.
+        The per-stage timings of the request are attached to the result under "trace".
+        Concurrent identical requests share one computation, marked "coalesced" in their result.
+        The database is resolved once, so the whole request uses the same schema and connection pool
+        even if the registry unloads and reloads the database meanwhile.
+        """
+        database_context = self._database_registry.get(self._database_name)
+        key = (
+            " ".join(natural_language_query.lower().split()),
+            self._use_rag,
+            self._database_name or self._database_registry.default_database_name,
+        )
+        (result, last_executed_prompt), coalesced = SingleFlight().do(
+            "generate_and_execute_sql",
+            key,
+            lambda: (
+                self._traced_generate_and_execute_sql(
+                    database_context, natural_language_query
+                ),
+                self._last_executed_prompt,
+            ),
+        )
+        self._last_executed_prompt = last_executed_prompt
+        return {**result, "coalesced": coalesced}
 
+    def _traced_generate_and_execute_sql(
+        self, database_context: DatabaseContext, natural_language_query: str
+    ) -> dict:
+        outcome = "error"
         try:
-            result = self._database.execute_query(sql_query)
+            with Tracer.trace("generate_and_execute_sql") as trace:
+                trace.root.set_attribute("use_rag", self._use_rag)
+                result = self._generate_and_execute_sql(
+                    database_context, natural_language_query
+                )
+            outcome = "refined" if result["refined"] else "success"
+        finally:
+            MetricsRegistry().increment("text2sql_requests_total", outcome=outcome)
+
+        result["trace"] = trace.to_dict()
+        if self._speculative_candidates > 1:
+            result["wasted_candidates"] = sum(
+                span["attributes"].get("wasted", 0)
+                for span in result["trace"]["spans"]
+                if span["name"] == "speculative_execution"
+            )
+        return result
+
+    def _generate_and_execute_sql(
+        self, database_context: DatabaseContext, natural_language_query: str
+    ) -> dict:
+        candidates, conversation = self._generate_sql(
+            database_context, natural_language_query
+        )
+
+        try:
+            sql_query, result = self._execute_for_tier(
+                database_context, conversation, candidates
+            )
             return {
                 "query": sql_query,
                 "result": result,
                 "refined": False,
                 "refinement_attempts": 0,
+                "tier": conversation.tier,
             }
         except QueryError as error:
             # If execution fails, try to refine the query
             return self._refine_and_execute(
-                natural_language_query, sql_query, str(error)
+                database_context,
+                natural_language_query,
+                conversation,
+                candidates[0],
+                str(error),
             )
 
     def _refine_and_execute(
         self,
+        database_context: DatabaseContext,
         natural_language_query: str,
+        conversation: _Conversation,
         original_query: str,
         error_message: str,
         attempt: int = 1,
@@ -107,109 +223,350 @@ class LLMTextToSQLService:
                 f"Last error: {error_message}"
             )
 
-        # Generate a refined query
-        refined_query = self._refine_sql(
-            natural_language_query, original_query, error_message, attempt
-        )
-
-        # Try to execute the refined query
         try:
-            result = self._database.execute_query(refined_query)
-            return {
-                "query": refined_query,
-                "result": result,
-                "refined": True,
-                "refinement_attempts": attempt,
-                "original_query": original_query,
-                "error_message": error_message,
-            }
+            with Tracer.span("refinement_attempt", attempt=attempt):
+                # Generate a refined query
+                candidates = self._refine_sql(
+                    database_context,
+                    natural_language_query,
+                    conversation,
+                    original_query,
+                    error_message,
+                    attempt,
+                )
+
+                # Try to execute the refined query
+                refined_query, result = self._execute_for_tier(
+                    database_context, conversation, candidates
+                )
         except QueryError as error:
             # If still failing, try to refine again recursively
             return self._refine_and_execute(
-                natural_language_query, refined_query, str(error), attempt + 1
+                database_context,
+                natural_language_query,
+                conversation,
+                candidates[0],
+                str(error),
+                attempt + 1,
             )
 
+        return {
+            "query": refined_query,
+            "result": result,
+            "refined": True,
+            "refinement_attempts": attempt,
+            "tier": conversation.tier,
+            "original_query": original_query,
+            "error_message": error_message,
+        }
+
     def generate_sql(self, natural_language_query: str) -> str:
-        try:
-            relevant_schema = self._get_schema(natural_language_query)
+        database_context = self._database_registry.get(self._database_name)
+        return self._generate_sql(database_context, natural_language_query)[0][0]
 
-            # Construct prompt with schema
-            prompt = LLMTextToSQLService._construct_prompt(
-                relevant_schema, natural_language_query
-            )
+    def _generate_sql(
+        self, database_context: DatabaseContext, natural_language_query: str
+    ) -> tuple[list[str], _Conversation]:
+        try:
+            relevant_schema = self._get_schema(database_context, natural_language_query)
 
-            # Update the last executed prompt
-            self._last_executed_prompt = prompt
+            # Construct the conversation with the schema in its system message
+            with Tracer.span("prompt_build"):
+                conversation = LLMTextToSQLService._construct_conversation(
+                    relevant_schema,
+                    natural_language_query,
+                    self._route(natural_language_query, relevant_schema),
+                )
 
-            return self._cleanup_generated_query(
-                self._open_ai_llm.generate_text(prompt)
-            )
+            return self._complete(conversation), conversation
 
         except Exception as e:
             raise QueryGenerationError(f"Failed to generate SQL: {str(e)}")
 
-    def _get_schema(self, natural_language_query: str) -> dict:
+    def _route(self, natural_language_query: str, schema: Mapping) -> str:
+        """The fast tier for simple questions, with few schema tables in the prompt and few words,
+        the strong tier otherwise or when no fast model is configured."""
+        if not self._config.openai_fast_model:
+            return STRONG_TIER
+        is_simple = (
+            len(schema) <= self._config.routing_max_tables
+            and len(natural_language_query.split())
+            <= self._config.routing_max_question_words
+        )
+        return FAST_TIER if is_simple else STRONG_TIER
+
+    def _get_schema(
+        self, database_context: DatabaseContext, natural_language_query: str
+    ) -> Mapping:
         """Retrieve the relevant schema if RAG is enabled, otherwise use the full schema."""
-        if self._use_rag:
-            # Retrieve relevant schema using RAG
-            return self._schema_excerption_service.retrieve_relevant_schema(
-                natural_language_query,
-                self._initial_amount_of_top_k_for_similarity_search,
-            )
-        else:
-            # Use the full schema for regular generation
-            return self._database_schema_service.retrieve(use_cache=True)
+        with Tracer.span("schema_retrieval", use_rag=self._use_rag) as span:
+            if self._use_rag:
+                # Retrieve relevant schema using RAG
+                schema = (
+                    database_context.schema_excerption_service.retrieve_relevant_schema(
+                        natural_language_query,
+                        self._initial_amount_of_top_k_for_similarity_search,
+                    )
+                )
+            else:
+                # Use the full schema for regular generation
+                schema = database_context.database_schema_service.retrieve(
+                    use_cache=True
+                )
+
+            span.set_attribute("tables", len(schema))
+            return schema
 
     def _refine_sql(
         self,
+        database_context: DatabaseContext,
         natural_language_query: str,
+        conversation: _Conversation,
         original_query: str,
         error_message: str,
         attempt: int,
-    ) -> str:
-        """Refine an SQL query using LLM based on execution error feedback."""
+    ) -> list[str]:
+        """Refine an SQL query using LLM based on execution error feedback.
+        The failed query and the error are appended to the conversation as a follow-up turn.
+        """
         try:
-            combined_query = (
-                f"{natural_language_query} {error_message} {original_query}"
-            )
+            additional_schema = {}
+            if self._use_rag:
+                # The error may point at tables the first retrieval missed
+                combined_query = (
+                    f"{natural_language_query} {error_message} {original_query}"
+                )
+                relevant_schema = self._get_schema(database_context, combined_query)
+                additional_schema = {
+                    table_name: table_data
+                    for table_name, table_data in relevant_schema.items()
+                    if table_name not in conversation.schema_tables
+                }
+
+            with Tracer.span("prompt_build"):
+                conversation.add_refinement(
+                    original_query,
+                    LLMTextToSQLService._construct_refine_prompt(
+                        additional_schema, error_message
+                    ),
+                )
+                conversation.schema_tables.update(additional_schema)
+
+            return self._complete(conversation)
 
-            relevant_schema = self._get_schema(combined_query)
+        except Exception as e:
+            raise QueryGenerationError(f"Failed to refine SQL: {str(e)}")
 
-            prompt = LLMTextToSQLService._construct_refine_prompt(
-                relevant_schema, natural_language_query, original_query, error_message
+    def _complete(self, conversation: _Conversation) -> list[str]:
+        """Ask the LLM for the next SQL query of the conversation, or for several
+        distinct candidates when speculative execution is enabled."""
+        # Update the last executed prompt
+        self._last_executed_prompt = conversation.render()
+
+        tier = conversation.tier
+        options = {"model": self._tier_model(tier)}
+        with Tracer.span("llm_tier", tier=tier, model=options["model"]) as span:
+            if self._speculative_candidates > 1:
+                options["temperature"] = self._config.speculative_temperature
+                generated_queries = self._open_ai_llm.generate_candidates(
+                    conversation.messages, self._speculative_candidates, options
+                )
+            else:
+                generated_queries = [
+                    self._open_ai_llm.generate_from_messages(
+                        conversation.messages, options
+                    )
+                ]
+        self._record_tier_call(tier, span)
+
+        candidates = []
+        for generated_query in generated_queries:
+            candidate = self._cleanup_generated_query(generated_query)
+            if candidate not in candidates:
+                candidates.append(candidate)
+        return candidates
+
+    def _tier_model(self, tier: str) -> str:
+        if tier == FAST_TIER:
+            return self._config.openai_fast_model
+        return self._config.openai_model
+
+    def _record_tier_call(self, tier: str, span) -> None:
+        """Add the latency and the token counts of the LLM calls made inside a tier span to the tier metrics."""
+        metrics = MetricsRegistry()
+        metrics.observe("text2sql_llm_tier_duration_seconds", span.duration, tier=tier)
+        for child in Tracer.child_spans(span):
+            for kind in ("prompt_tokens", "completion_tokens"):
+                metrics.increment(
+                    "text2sql_llm_tier_tokens_total",
+                    child.attributes.get(kind, 0),
+                    tier=tier,
+                    kind=kind.removesuffix("_tokens"),
+                )
+
+    def _execute_for_tier(
+        self,
+        database_context: DatabaseContext,
+        conversation: _Conversation,
+        candidates: list[str],
+    ) -> tuple[str, dict]:
+        """Execute the candidates and record the outcome of the tier that generated them.
+        When the fast tier fails, the conversation escalates to the strong tier for its refinements.
+        """
+        tier = conversation.tier
+        try:
+            # Several candidates are checked before execution anyway
+            if tier == FAST_TIER and len(candidates) == 1:
+                with Tracer.span("validation", candidates=1) as span:
+                    rejection = self._check_candidate(database_context, candidates[0])
+                    span.set_attribute("rejected", 1 if rejection else 0)
+                if rejection:
+                    raise QueryError(rejection)
+            executed = self._execute_candidates(database_context, candidates)
+        except QueryError:
+            MetricsRegistry().increment(
+                "text2sql_llm_tier_requests_total", tier=tier, outcome="failure"
             )
+            if tier == FAST_TIER:
+                conversation.tier = STRONG_TIER
+                MetricsRegistry().increment("text2sql_llm_tier_escalations_total")
+            raise
 
-            # Update the last executed prompt
-            self._last_executed_prompt = prompt
+        MetricsRegistry().increment(
+            "text2sql_llm_tier_requests_total", tier=tier, outcome="success"
+        )
+        return executed
+
+    def _execute_candidates(
+        self, database_context: DatabaseContext, candidates: list[str]
+    ) -> tuple[str, dict]:
+        """Execute the candidates and return the first that succeeds with the first page of its result.
+        Raises the QueryError of the first candidate when none succeeds."""
+        if len(candidates) == 1:
+            return candidates[0], database_context.query_result_service.fetch_page(
+                candidates[0]
+            )
 
-            return self._cleanup_generated_query(
-                self._open_ai_llm.generate_text(prompt)
+        errors = {}
+        runnable = []
+        with Tracer.span("validation", candidates=len(candidates)) as span:
+            for candidate in candidates:
+                rejection = self._check_candidate(database_context, candidate)
+                if rejection:
+                    errors[candidate] = QueryError(rejection)
+                else:
+                    runnable.append(candidate)
+            span.set_attribute("rejected", len(errors))
+
+        winner = None
+        with Tracer.span("speculative_execution", candidates=len(runnable)) as span:
+            if runnable:
+                winner = self._execute_first_success(database_context, runnable, errors)
+
+            outcomes = {
+                "rejected": len(candidates) - len(runnable),
+                "failed": len(errors) - (len(candidates) - len(runnable)),
+                "won": 1 if winner else 0,
+            }
+            outcomes["cancelled"] = len(runnable) - outcomes["failed"] - outcomes["won"]
+            metrics = MetricsRegistry()
+            for outcome, count in outcomes.items():
+                span.set_attribute(outcome, count)
+                metrics.increment(
+                    "text2sql_speculative_candidates_total", count, outcome=outcome
+                )
+            span.set_attribute("wasted", len(candidates) - outcomes["won"])
+            metrics.increment(
+                "text2sql_speculative_wasted_candidates_total",
+                len(candidates) - outcomes["won"],
             )
 
-        except Exception as e:
-            raise QueryGenerationError(f"Failed to refine SQL: {str(e)}")
+        if winner is None:
+            raise errors[candidates[0]]
+        return winner
+
+    def _execute_first_success(
+        self, database_context: DatabaseContext, candidates: list[str], errors: dict
+    ) -> tuple[str, dict] | None:
+        """Run the candidates concurrently on pooled connections, cancel the rest once one succeeds."""
+        cancellation = QueryCancellation()
+        executor = ThreadPoolExecutor(
+            max_workers=len(candidates), thread_name_prefix="sql-candidate"
+        )
+        try:
+            futures = {
+                # Each task gets a copy of the context, so its spans join the current trace
+                executor.submit(
+                    contextvars.copy_context().run,
+                    database_context.query_result_service.fetch_page,
+                    candidate,
+                    cancellation=cancellation,
+                ): candidate
+                for candidate in candidates
+            }
+            for future in as_completed(futures):
+                try:
+                    return futures[future], future.result()
+                except QueryError as error:
+                    errors[futures[future]] = error
+            return None
+        finally:
+            cancellation.cancel()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _check_candidate(
+        self, database_context: DatabaseContext, query: str
+    ) -> str | None:
+        """Reason a candidate cannot succeed, found without a database round trip, or None."""
+        if not SQLText.is_read_only(query):
+            return "Only a single read-only SELECT query is allowed"
+
+        schema = database_context.database_schema_service.retrieve(use_cache=True)
+        known_tables = {table_name.lower() for table_name in schema} | {
+            table_name.split(".", 1)[-1].lower() for table_name in schema
+        }
+        unknown_tables = [
+            table_name
+            for table_name in SQLText.referenced_tables(query)
+            if table_name.lower() not in known_tables
+            and table_name.split(".")[0].lower() not in _SYSTEM_SCHEMAS
+        ]
+        if unknown_tables:
+            return f"Invalid object name: {', '.join(unknown_tables)} is not in the database schema"
+        return None
 
     @staticmethod
-    def _construct_prompt(database_schema: dict, natural_language_query: str) -> str:
-        return _DEFAULT_PROMPT_TEMPLATE.format(
-            database_schema=(json.dumps(database_schema, indent=2)),
-            natural_language_query=natural_language_query,
-            generation_rules=_GENERATION_RULES,
+    def _construct_conversation(
+        database_schema: Mapping, natural_language_query: str, tier: str = STRONG_TIER
+    ) -> _Conversation:
+        return _Conversation(
+            _SYSTEM_PROMPT_TEMPLATE.format(
+                database_schema=(
+                    # The full schema, serialized once per schema version
+                    database_schema.to_json()
+                    if isinstance(database_schema, SchemaModel)
+                    else json.dumps(database_schema, indent=2)
+                ),
+                generation_rules=_GENERATION_RULES.strip(),
+            ),
+            _QUESTION_PROMPT_TEMPLATE.format(
+                natural_language_query=natural_language_query
+            ),
+            database_schema,
+            tier,
         )
 
     @staticmethod
-    def _construct_refine_prompt(
-        database_schema: dict,
-        natural_language_query: str,
-        original_query: str,
-        error_message: str,
-    ) -> str:
+    def _construct_refine_prompt(additional_schema: dict, error_message: str) -> str:
         return _REFINE_PROMPT_TEMPLATE.format(
-            database_schema=(json.dumps(database_schema, indent=2)),
-            natural_language_query=natural_language_query,
-            original_query=original_query,
             error_message=error_message,
-            generation_rules=_GENERATION_RULES,
+            additional_schema=(
+                _ADDITIONAL_SCHEMA_TEMPLATE.format(
+                    database_schema=json.dumps(additional_schema, indent=2)
+                )
+                if additional_schema
+                else ""
+            ),
         )
 
     @staticmethod
@@ -219,6 +576,10 @@ class LLMTextToSQLService:
     def set_generation_mode(self, use_rag: bool) -> None:
         self._use_rag = use_rag
 
+    def set_database(self, database_name: str | None) -> None:
+        """Select the database queries are generated for, None selects the default one."""
+        self._database_name = database_name
+
     def get_last_executed_prompt(self) -> str:
         return self._last_executed_prompt
 
@@ -229,3 +590,7 @@ class LLMTextToSQLService:
     @property
     def _max_refinement_attempts(self) -> int:
         return 3
+
+    @property
+    def _speculative_candidates(self) -> int:
+        return self._config.speculative_candidates
@@ -0,0 +1,201 @@
+import csv
+import datetime
+import decimal
+import io
+import re
+from typing import BinaryIO
+from src.infrastructure.config import EnvConfig
+from src.infrastructure.database import Database, QueryCancellation
+from src.infrastructure.exceptions import QueryError
+from src.infrastructure.sql_text import SQLText
+from src.infrastructure.tracing import Tracer
+
+CSV_FORMAT = "csv"
+PARQUET_FORMAT = "parquet"
+EXPORT_FORMATS = (CSV_FORMAT, PARQUET_FORMAT)
+
+# SQL Server errors the OFFSET ... FETCH NEXT rewrite itself can cause: ORDER BY items missing from
+# the select list of a set operation (104) or DISTINCT (145), FETCH NEXT (153), a constant ORDER BY
+# (408), TOP with OFFSET (10741), and servers without OFFSET support
+_PAGINATION_ERRORS = re.compile(
+    r"\((104|145|153|408|10741)\)|near '(OFFSET|ROWS|FETCH|NEXT)'", re.IGNORECASE
+)
+
+
+class QueryResultService:
+    """Service for reading the result of a generated query page by page, counting and exporting it
+    without holding every row in memory."""
+
+    def __init__(self, database: Database):
+        self._database = database
+        self._config = EnvConfig()
+
+    def fetch_page(
+        self,
+        query: str,
+        page: int = 0,
+        cancellation: QueryCancellation | None = None,
+    ) -> dict:
+        """Execute the query for one page of rows. Queries that cannot be paginated on the server,
+        such as TOP queries or statements that change data, or whose paginated form is rejected by the
+        server, run once in full and come back with "paginated" set to False, to be paged through in
+        memory. Any other error of the paginated query is raised as it is.
+        """
+        page_size = self._page_size
+        # One extra row tells whether there is a next page without counting
+        paginated_query = SQLText.paginate(query, page * page_size, page_size + 1)
+        if paginated_query is None:
+            result = self._database.execute_query(query, cancellation=cancellation)
+            return {**result, "paginated": False, "page_size": page_size}
+
+        try:
+            result = self._database.execute_query(
+                paginated_query, cancellation=cancellation
+            )
+        except QueryError as e:
+            if not _PAGINATION_ERRORS.search(str(e)):
+                raise
+            result = self._database.execute_query(query, cancellation=cancellation)
+            return {**result, "paginated": False, "page_size": page_size}
+
+        return {
+            **result,
+            "rows": result["rows"][:page_size],
+            "paginated": True,
+            "page": page,
+            "page_size": page_size,
+            "has_next_page": len(result["rows"]) > page_size,
+        }
+
+    def count_rows(self, query: str) -> int:
+        """Count the rows of a read-only query, with COUNT_BIG on the server where the query allows
+        it, otherwise by streaming the result and discarding the rows."""
+        if not SQLText.is_read_only(query):
+            raise QueryError("Only read-only queries can be counted")
+
+        with Tracer.span("row_count") as span:
+            count_query = SQLText.count_query(query)
+            if count_query is not None:
+                try:
+                    result = self._database.execute_query(count_query)
+                    span.set_attribute("method", "count_big")
+                    return result["rows"][0]["row_count"]
+                except QueryError:
+                    # E.g. columns without a name, which a derived table does not allow
+                    pass
+
+            span.set_attribute("method", "stream")
+            return sum(
+                len(batch)
+                for _, batch in self._database.stream_query(query, self._batch_size)
+            )
+
+    def export(self, query: str, file_format: str, output: BinaryIO) -> int:
+        """Write the full result of a read-only query to a binary file batch by batch and return the row count."""
+        if not SQLText.is_read_only(query):
+            raise QueryError("Only read-only queries can be exported")
+        if file_format not in EXPORT_FORMATS:
+            raise ValueError(f"Unsupported export format: {file_format}")
+
+        with Tracer.span("export", format=file_format) as span:
+            batches = self._database.stream_query(query, self._batch_size)
+            if file_format == CSV_FORMAT:
+                row_count = QueryResultService._write_csv(batches, output)
+            else:
+                row_count = QueryResultService._write_parquet(batches, output)
+            span.set_attribute("rows", row_count)
+            return row_count
+
+    @staticmethod
+    def _write_csv(batches, output: BinaryIO) -> int:
+        text_output = io.TextIOWrapper(output, encoding="utf-8", newline="")
+        writer = csv.writer(text_output)
+        row_count = 0
+        try:
+            for description, batch in batches:
+                if row_count == 0:
+                    writer.writerow([column[0] for column in description])
+                writer.writerows(batch)
+                row_count += len(batch)
+        finally:
+            text_output.flush()
+            # Leave the caller's file open
+            text_output.detach()
+        return row_count
+
+    @staticmethod
+    def _write_parquet(batches, output: BinaryIO) -> int:
+        import pyarrow as pa  # Deferred, only needed for Parquet exports
+        import pyarrow.parquet as pq
+
+        writer = None
+        row_count = 0
+        try:
+            for description, batch in batches:
+                if writer is None:
+                    schema = pa.schema(
+                        [
+                            (
+                                column[0],
+                                QueryResultService._arrow_type(
+                                    pa, column, [row[index] for row in batch]
+                                ),
+                            )
+                            for index, column in enumerate(description)
+                        ]
+                    )
+                    writer = pq.ParquetWriter(output, schema)
+
+                arrays = []
+                for index, field in enumerate(writer.schema):
+                    values = [row[index] for row in batch]
+                    if field.type == pa.string():
+                        values = [
+                            None if value is None else str(value) for value in values
+                        ]
+                    arrays.append(pa.array(values, type=field.type))
+                writer.write_table(pa.Table.from_arrays(arrays, schema=writer.schema))
+                row_count += len(batch)
+        finally:
+            if writer is not None:
+                writer.close()
+        return row_count
+
+    @staticmethod
+    def _arrow_type(pa, column: tuple, values: list):
+        """The Parquet column type from the DB-API description of the column, so that NULLs and
+        the decimal scales of later batches fit. Drivers that report no type code get the type of
+        the first value, text when there is none or no exact type is known."""
+        type_code, precision, scale = column[1], column[4], column[5]
+        if type_code is None:
+            value = next((value for value in values if value is not None), None)
+            type_code = type(value)
+            precision = scale = None
+
+        if type_code is bool:
+            return pa.bool_()
+        if type_code is int:
+            return pa.int64()
+        if type_code is float:
+            return pa.float64()
+        if type_code is decimal.Decimal:
+            if precision and precision <= 38 and scale is not None:
+                return pa.decimal128(precision, scale)
+            return pa.string()
+        if type_code is datetime.datetime:
+            return pa.timestamp("us")
+        if type_code is datetime.date:
+            return pa.date32()
+        if type_code is datetime.time:
+            return pa.time64("us")
+        if type_code in (bytes, bytearray):
+            return pa.binary()
+        return pa.string()
+
+    @property
+    def _page_size(self) -> int:
+        return self._config.result_page_size
+
+    @property
+    def _batch_size(self) -> int:
+        return self._config.export_batch_size
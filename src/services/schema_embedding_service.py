@@ -1,53 +1,190 @@
 import json
+import threading
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.vectorstores import FAISS
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 from langchain_openai import OpenAIEmbeddings
 from src.infrastructure.config import EnvConfig
+from src.infrastructure.faiss_index import FaissIndexFactory
+from src.infrastructure.single_flight import SingleFlight
+from src.infrastructure.tracing import Tracer
 from src.services.database_schema_service import DatabaseSchemaService
-from src.utils import Singleton
 
+TABLE_GRANULARITY = "table"
+COLUMN_GRANULARITY = "column"
 
-class SchemaEmbeddingService(metaclass=Singleton):
-    """Service for ingesting database schema into a vector store."""
 
-    def __init__(self):
-        self._database_schema_service = DatabaseSchemaService()
+class SchemaEmbeddingService:
+    """Service for ingesting the schema of one database into a vector store."""
+
+    def __init__(
+        self,
+        database_schema_service: DatabaseSchemaService,
+        embeddings: Embeddings | None = None,
+    ):
+        self._database_schema_service = database_schema_service
         self._config = EnvConfig()
-        self._embeddings = OpenAIEmbeddings(
+        self._embeddings = embeddings or OpenAIEmbeddings(
             model="text-embedding-3-small", api_key=self._config.openai_api_key
         )
+        self._index_factory = FaissIndexFactory(
+            flat_max_vectors=self._config.faiss_flat_max_vectors,
+            hnsw_max_vectors=self._config.faiss_hnsw_max_vectors,
+            hnsw_ef_search=self._config.faiss_hnsw_ef_search,
+            ivf_nprobe=self._config.faiss_ivf_nprobe,
+        )
         self._vector_store = None
-        self._embedded = False
+        self._index_type = None
+        self._memory_bytes = 0
+        # Version of the schema the vector store was built from, None before the first build
+        self._embedded_schema_version = None
+        # Guards starting the background build only, never held while embedding
+        self._background_lock = threading.Lock()
+        self._background_embedding = None
 
     def embed_schema(self) -> None:
-        """Embed database schema into a vector store."""
-        # Check if the vector store already exists
-        if not self._embedded:
-            # Get the schema
-            schema = self._database_schema_service.retrieve(use_cache=True)
+        """Embed database schema into a vector store. Callers arriving during a build wait for it."""
+        if not self._is_up_to_date():
+            SingleFlight().do("schema_embedding", id(self), self._embed_schema)
+
+    def embed_schema_in_background(self) -> None:
+        """Start embedding the schema in a daemon thread, first use of the vector store waits for it."""
+        with self._background_lock:
+            if self._is_up_to_date() or (
+                self._background_embedding is not None
+                and self._background_embedding.is_alive()
+            ):
+                return
+
+            self._background_embedding = threading.Thread(
+                target=self._embed_schema_quietly, name="schema-embedding", daemon=True
+            )
+            self._background_embedding.start()
+
+    def _is_up_to_date(self) -> bool:
+        return (
+            self._embedded_schema_version is not None
+            and self._embedded_schema_version
+            == self._database_schema_service.schema_version
+        )
+
+    def _embed_schema_quietly(self) -> None:
+        try:
+            self.embed_schema()
+        except Exception:
+            # The error is raised again when the vector store is first used
+            pass
+
+    def _embed_schema(self) -> None:
+        # A build that finished just before this one started may have made it unnecessary
+        if self._is_up_to_date():
+            return
 
-            # Create documents from the schema
+        # Get the schema
+        schema = self._database_schema_service.retrieve(use_cache=True)
+        schema_version = self._database_schema_service.schema_version
+
+        # Create documents from the schema
+        if self.document_granularity == COLUMN_GRANULARITY:
+            documents = self._create_column_documents(schema)
+        else:
             documents = self._create_schema_documents(schema)
 
-            # Create the vector store
-            self._vector_store = FAISS.from_documents(documents, self._embeddings)
+        # Create the vector store
+        self._vector_store = self._create_vector_store(documents)
+
+        self._embedded_schema_version = schema_version
+
+    def _create_vector_store(self, documents: list[Document]) -> FAISS:
+        """Embed the documents into a FAISS index whose type fits the corpus size."""
+        texts = [document.page_content for document in documents]
+        with Tracer.span("embedding", documents=len(texts)):
+            vectors = np.array(self._embeddings.embed_documents(texts), dtype="float32")
+
+        self._index_type = self._index_factory.select_index_type(
+            len(vectors), self._config.faiss_index_type
+        )
+        with Tracer.span("faiss_build", index_type=self._index_type):
+            index = self._index_factory.create(vectors, self._index_type)
+
+            vector_store = FAISS(
+                embedding_function=self._embeddings,
+                index=index,
+                docstore=InMemoryDocstore(),
+                index_to_docstore_id={},
+            )
+            vector_store.add_embeddings(
+                zip(texts, vectors.tolist()),
+                metadatas=[document.metadata for document in documents],
+            )
 
-            self._embedded = True
+        # The index plus the documents kept in the docstore
+        self._memory_bytes = self._index_factory.estimate_size(
+            self._index_type, len(vectors), vectors.shape[1]
+        ) + sum(len(text) for text in texts)
+        return vector_store
+
+    def embed_query(self, query: str) -> list[float]:
+        """Embed a query with the same model as the schema documents."""
+        return self._embeddings.embed_query(query)
 
     @staticmethod
     def _create_schema_documents(schema: dict) -> list[Document]:
         """Create documents from the schema for each table with its columns and relationships."""
         return [
             Document(
-                json.dumps({"table_name": table_name, "table_data": schema[table_name]})
+                json.dumps(
+                    {"table_name": table_name, "table_data": schema[table_name]}
+                ),
+                metadata={"table_name": table_name},
+            )
+            for table_name in schema
+        ]
+
+    @staticmethod
+    def _create_column_documents(schema: dict) -> list[Document]:
+        """Create one document per column, tagged with the table the column belongs to."""
+        return [
+            Document(
+                json.dumps(
+                    {
+                        "table_name": table_name,
+                        "column_name": column_name,
+                        "column_data": column_data,
+                    }
+                ),
+                metadata={"table_name": table_name},
             )
             for table_name in schema
+            for column_name, column_data in schema[table_name]["columns"].items()
         ]
 
+    @property
+    def document_granularity(self) -> str:
+        """Whether the vector store holds one document per table or per column."""
+        if self._config.schema_document_granularity == COLUMN_GRANULARITY:
+            return COLUMN_GRANULARITY
+        return TABLE_GRANULARITY
+
+    @property
+    def memory_bytes(self) -> int:
+        """Approximate memory held by the vector store, 0 before it is built."""
+        return self._memory_bytes
+
+    @property
+    def index_type(self) -> str | None:
+        """The FAISS index type the vector store was built with."""
+        return self._index_type
+
     @property
     def vector_store(self) -> FAISS:
         """Get the vector store."""
         if self._vector_store is None:
             self.embed_schema()
+        elif not self._is_up_to_date():
+            # The schema changed since the build, keep searching the old index until the new one is ready
+            self.embed_schema_in_background()
 
         return self._vector_store
@@ -2,24 +2,48 @@ import json
 
 from langchain_core.documents import Document
 
-from src.services.schema_embedding_service import SchemaEmbeddingService
-from src.utils import Singleton
+from src.infrastructure.tracing import Tracer
+from src.services.database_schema_service import DatabaseSchemaService
+from src.services.schema_embedding_service import (
+    COLUMN_GRANULARITY,
+    SchemaEmbeddingService,
+)
 
 
-class SchemaExcerptionService(metaclass=Singleton):
-    """Service for retrieving relevant schema information based on a query."""
+class SchemaExcerptionService:
+    """Service for retrieving relevant schema information of one database based on a query."""
 
-    def __init__(self):
-        self._schema_ingestion_service = SchemaEmbeddingService()
-        self._schema_ingestion_service.embed_schema()  # Ensure schema is ingested
+    def __init__(
+        self,
+        database_schema_service: DatabaseSchemaService,
+        schema_embedding_service: SchemaEmbeddingService,
+    ):
+        self._database_schema_service = database_schema_service
+        self._schema_ingestion_service = schema_embedding_service
+        # Ensure schema is ingested, without blocking until the first retrieval
+        self._schema_ingestion_service.embed_schema_in_background()
 
     def retrieve_relevant_schema(self, query: str, top_k: int) -> dict:
         """Retrieve relevant schema information based on a query."""
         # Get the vector store
         vector_store = self._schema_ingestion_service.vector_store
 
+        with Tracer.span("embedding"):
+            query_embedding = self._schema_ingestion_service.embed_query(query)
+
+        if self._schema_ingestion_service.document_granularity == COLUMN_GRANULARITY:
+            # Several columns of the same table can match, so search wider
+            with Tracer.span(
+                "faiss_search", k=top_k * self._column_search_oversampling
+            ):
+                docs = vector_store.similarity_search_by_vector(
+                    query_embedding, k=top_k * self._column_search_oversampling
+                )
+            return self._process_retrieved_column_documents(docs, top_k)
+
         # Retrieve similar documents
-        docs = vector_store.similarity_search(query, k=top_k)
+        with Tracer.span("faiss_search", k=top_k):
+            docs = vector_store.similarity_search_by_vector(query_embedding, k=top_k)
 
         # Process the documents into a schema dictionary
         return self._process_retrieved_documents(docs)
@@ -35,3 +59,24 @@ class SchemaExcerptionService(metaclass=Singleton):
             result[table_name] = metadata
 
         return result
+
+    def _process_retrieved_column_documents(
+        self, docs: list[Document], top_k: int
+    ) -> dict:
+        """Map column hits to their tables, keeping the top_k best ranked distinct tables."""
+        schema = self._database_schema_service.retrieve(use_cache=True)
+        result = {}
+
+        for doc in docs:
+            table_name = doc.metadata.get("table_name")
+            if table_name in result or table_name not in schema:
+                continue
+            result[table_name] = schema[table_name]
+            if len(result) == top_k:
+                break
+
+        return result
+
+    @property
+    def _column_search_oversampling(self) -> int:
+        return 10
@@ -0,0 +1,309 @@
+import json
+import sys
+from collections.abc import Mapping
+from typing import Iterator
+
+# Integers CPython preallocates and shares
+_SMALL_INT_MIN, _SMALL_INT_MAX = -5, 256
+# A key and a value pointer in the dict of interned strings, with its index slot and spare capacity
+_INTERNED_ENTRY_BYTES = 48
+
+
+def _intern(value):
+    # Names, data types and "YES"/"NO" repeat across thousands of columns, keep one copy of each
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class Column:
+    """A column of a table, in a slotted record instead of a dict per column."""
+
+    __slots__ = (
+        "name",
+        "data_type",
+        "character_maximum_length",
+        "is_nullable",
+        "column_default",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        data_type: str,
+        character_maximum_length: int | None,
+        is_nullable: str,
+        column_default: str | None,
+    ):
+        self.name = _intern(name)
+        self.data_type = _intern(data_type)
+        self.character_maximum_length = character_maximum_length
+        self.is_nullable = _intern(is_nullable)
+        self.column_default = _intern(column_default)
+
+    def to_dict(self) -> dict:
+        return {
+            "data_type": self.data_type,
+            "character_maximum_length": self.character_maximum_length,
+            "is_nullable": self.is_nullable,
+            "column_default": self.column_default,
+        }
+
+
+class ForeignKey:
+    """A foreign key column, shared by the table holding it and the table it references."""
+
+    __slots__ = (
+        "constraint_name",
+        "table",
+        "column",
+        "referenced_table",
+        "referenced_column",
+    )
+
+    def __init__(
+        self,
+        constraint_name: str,
+        table: str,
+        column: str,
+        referenced_table: str,
+        referenced_column: str,
+    ):
+        self.constraint_name = _intern(constraint_name)
+        self.table = _intern(table)
+        self.column = _intern(column)
+        self.referenced_table = _intern(referenced_table)
+        self.referenced_column = _intern(referenced_column)
+
+    def to_foreign_key_dict(self) -> dict:
+        """The foreign key as seen from the table holding it."""
+        return {
+            "constraint_name": self.constraint_name,
+            "column": self.column,
+            "references_table": self.referenced_table,
+            "references_column": self.referenced_column,
+        }
+
+    def to_referenced_by_dict(self) -> dict:
+        """The foreign key as seen from the table it references."""
+        return {
+            "constraint_name": self.constraint_name,
+            "table": self.table,
+            "column": self.column,
+            "referenced_column": self.referenced_column,
+        }
+
+
+class Table:
+    """A table with its columns in catalog order and its relationships."""
+
+    __slots__ = ("name", "columns", "foreign_keys", "referenced_by")
+
+    def __init__(self, name: str):
+        self.name = _intern(name)
+        self.columns = []
+        self.foreign_keys = []
+        self.referenced_by = []
+
+    def to_dict(self) -> dict:
+        """The table in the layout of the prompts and the vector store documents."""
+        return {
+            "columns": {column.name: column.to_dict() for column in self.columns},
+            "relationships": {
+                "foreign_keys": [
+                    foreign_key.to_foreign_key_dict()
+                    for foreign_key in self.foreign_keys
+                ],
+                "referenced_by": [
+                    foreign_key.to_referenced_by_dict()
+                    for foreign_key in self.referenced_by
+                ],
+            },
+        }
+
+
+class SchemaModel(Mapping):
+    """
+    Compact in-memory schema of one database. Tables are kept in a list with a name to index map,
+    columns and foreign keys in slotted records with interned strings. It reads like the former
+    schema dict, keyed by "schema_name.table_name": the dict of a table is built when it is looked
+    up, so only the tables a prompt or document needs are ever expanded.
+    """
+
+    def __init__(self):
+        self._tables = []
+        self._table_index = {}
+        self._json = None
+
+    def add_column(
+        self,
+        table_name: str,
+        column_name: str,
+        data_type: str,
+        character_maximum_length: int | None,
+        is_nullable: str,
+        column_default: str | None,
+    ) -> None:
+        """Append a column, creating its table on first use."""
+        self._json = None
+        index = self._table_index.get(table_name)
+        if index is None:
+            index = len(self._tables)
+            table = Table(table_name)
+            self._tables.append(table)
+            self._table_index[table.name] = index
+        self._tables[index].columns.append(
+            Column(
+                column_name,
+                data_type,
+                character_maximum_length,
+                is_nullable,
+                column_default,
+            )
+        )
+
+    def add_foreign_key(
+        self,
+        constraint_name: str,
+        table_name: str,
+        column_name: str,
+        referenced_table_name: str,
+        referenced_column_name: str,
+    ) -> None:
+        """Record a foreign key on both tables, ignored when either table is unknown."""
+        self._json = None
+        table = self.table(table_name)
+        referenced_table = self.table(referenced_table_name)
+        if table is None or referenced_table is None:
+            return
+
+        foreign_key = ForeignKey(
+            constraint_name,
+            table.name,
+            column_name,
+            referenced_table.name,
+            referenced_column_name,
+        )
+        table.foreign_keys.append(foreign_key)
+        referenced_table.referenced_by.append(foreign_key)
+
+    def table(self, table_name: str) -> Table | None:
+        index = self._table_index.get(table_name)
+        return None if index is None else self._tables[index]
+
+    def __getitem__(self, table_name: str) -> dict:
+        table = self.table(table_name)
+        if table is None:
+            raise KeyError(table_name)
+        return table.to_dict()
+
+    def __contains__(self, table_name) -> bool:
+        return table_name in self._table_index
+
+    def __iter__(self) -> Iterator[str]:
+        return (table.name for table in self._tables)
+
+    def __len__(self) -> int:
+        return len(self._tables)
+
+    def to_json(self) -> str:
+        """The whole schema as indented JSON, for the sidebar and the prompts of regular generation.
+        Serialized table by table on first use and kept, so repeated calls cost nothing.
+        """
+        if self._json is None:
+            tables = [
+                f"  {json.dumps(table.name)}: "
+                + json.dumps(table.to_dict(), indent=2).replace("\n", "\n  ")
+                for table in self._tables
+            ]
+            self._json = "{\n" + ",\n".join(tables) + "\n}" if tables else "{}"
+        return self._json
+
+    @property
+    def json_bytes(self) -> int:
+        """Memory held by the JSON kept by to_json, 0 before it is used."""
+        return 0 if self._json is None else sys.getsizeof(self._json)
+
+    def to_compact(self) -> dict:
+        """Plain lists for JSON snapshots, without repeating the keys of every column."""
+        return {
+            "tables": [
+                [
+                    table.name,
+                    [
+                        [
+                            column.name,
+                            column.data_type,
+                            column.character_maximum_length,
+                            column.is_nullable,
+                            column.column_default,
+                        ]
+                        for column in table.columns
+                    ],
+                ]
+                for table in self._tables
+            ],
+            "foreign_keys": [
+                [
+                    foreign_key.constraint_name,
+                    foreign_key.table,
+                    foreign_key.column,
+                    foreign_key.referenced_table,
+                    foreign_key.referenced_column,
+                ]
+                for table in self._tables
+                for foreign_key in table.foreign_keys
+            ],
+        }
+
+    @staticmethod
+    def from_compact(compact: dict) -> "SchemaModel":
+        schema = SchemaModel()
+        for table_name, columns in compact["tables"]:
+            for column in columns:
+                schema.add_column(table_name, *column)
+        for foreign_key in compact["foreign_keys"]:
+            schema.add_foreign_key(*foreign_key)
+        return schema
+
+    def estimate_size(self) -> int:
+        """Approximate bytes held by the model, each distinct string and integer counted once,
+        with its entry in the interpreter's table of interned strings."""
+        seen = set()
+
+        def values_size(*values) -> int:
+            size = 0
+            for value in values:
+                # None and the small integers are shared by the whole interpreter
+                if value is None or (
+                    isinstance(value, int) and _SMALL_INT_MIN <= value <= _SMALL_INT_MAX
+                ):
+                    continue
+                if id(value) not in seen:
+                    seen.add(id(value))
+                    size += sys.getsizeof(value)
+                    if isinstance(value, str):
+                        size += _INTERNED_ENTRY_BYTES
+            return size
+
+        size = sys.getsizeof(self._tables) + sys.getsizeof(self._table_index)
+        for index, table in enumerate(self._tables):
+            size += sys.getsizeof(table) + values_size(table.name, index)
+            for records in (table.columns, table.foreign_keys, table.referenced_by):
+                size += sys.getsizeof(records)
+            for column in table.columns:
+                size += sys.getsizeof(column) + values_size(
+                    column.name,
+                    column.data_type,
+                    column.character_maximum_length,
+                    column.is_nullable,
+                    column.column_default,
+                )
+            # Each foreign key is shared with referenced_by of the referenced table
+            for foreign_key in table.foreign_keys:
+                size += sys.getsizeof(foreign_key) + values_size(
+                    foreign_key.constraint_name,
+                    foreign_key.table,
+                    foreign_key.column,
+                    foreign_key.referenced_table,
+                    foreign_key.referenced_column,
+                )
+        return size
@@ -1,14 +1,29 @@
+import threading
+
+
 class Singleton(type):
     """
     A metaclass that can be used to create singleton classes.
+    Instances are created under a lock, so threads racing to create one get the same instance.
     Example usage:
         class MyClass(metaclass=Singleton):
             pass
     """
 
     _instances = {}
+    _lock = threading.RLock()
 
     def __call__(cls, *args, **kwargs):
         if cls not in cls._instances:
-            cls._instances[cls] = super(Singleton, cls).__call__(*args, **kwargs)
+            with cls._lock:
+                if cls not in cls._instances:
+                    cls._instances[cls] = super(Singleton, cls).__call__(
+                        *args, **kwargs
+                    )
         return cls._instances[cls]
+
+    @classmethod
+    def clear_instances(mcs) -> None:
+        """Forget every created instance, so the next calls create fresh ones."""
+        with mcs._lock:
+            mcs._instances.clear()